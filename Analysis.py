@@ -0,0 +1,314 @@
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from GameState import *
+from Search import *
+from Symmetry import CELL_MAPS, symmetries, unique_moves
+from GameRecord import (POSITIONS_MAGIC, from_notation, read_positions,
+                        to_notation, unpack_position)
+
+MoveAnalysis = collections.namedtuple('MoveAnalysis',
+                                      ['move', 'score', 'depth', 'pv'])
+MoveAnalysis.__doc__ = """The analysis of one legal move.
+
+Attributes:
+    move: The encoded move.
+    score: The exact score of the move from the mover's perspective.
+    depth: The depth the move was searched to, the move included.
+    pv: The principal variation, a tuple of encoded moves starting with
+      move.
+"""
+
+# Per worker process state, set up by _init_worker
+_worker_analyzer = None
+
+
+class Analyzer:
+    """Scores every legal move of a position (a multi-PV search).
+
+    Every root move is searched with a full window, so each score is exact
+    rather than a bound, deepening iteratively until max_depth or the
+    budget runs out. The moves share one AlphaBetaSearch and its
+    TranspositionTable, so positions reached by several moves, and by the
+    previous iteration, are searched once. Root moves that are symmetric
+    images of an earlier move are not searched: they take its score and the
+    image of its principal variation. The principal variations are read
+    back from the table.
+
+    Attributes:
+        search: The AlphaBetaSearch scoring the moves.
+        nodes: The number of nodes visited by the most recent analysis.
+        depth: The depth of the deepest completed iteration.
+        elapsed: The wall clock seconds of the most recent analysis.
+    """
+
+    def __init__(self, max_depth=6, time_limit=None, node_limit=None,
+                 weights=None, table=None):
+        """Initializes the analyzer with the search's depth and budget.
+
+        Args:
+            max_depth: The deepest iteration to search, in plies.
+            time_limit: Wall clock budget per position in seconds, None for
+              no limit.
+            node_limit: Node budget per position, None for no limit.
+            weights: The Weights of the evaluation, None for the GameState
+              heuristic.
+            table: The TranspositionTable to share, see AlphaBetaSearch.
+        """
+        self.search = AlphaBetaSearch(max_depth, time_limit, node_limit,
+                                      table, weights)
+        self.nodes = 0
+        self.depth = 0
+        self.elapsed = 0.0
+
+    def analyze(self, game):
+        """Scores and ranks every legal move of a position.
+
+        Args:
+            game: The position to analyze. It is restored before returning.
+
+        Return:
+            A list of MoveAnalysis, one per legal move, best first. Moves
+            with equal scores keep the search order. The list is empty if
+            the game is over, and every move has depth 0 and no score if no
+            iteration completed within the budget.
+        """
+        search = self.search
+        search.reset_budget()
+        start = time.perf_counter()
+        stabilizer = symmetries(game)
+        moves = unique_moves(search.order_moves(game), stabilizer)
+        results = [MoveAnalysis(move, None, 0, (move,)) for move in moves]
+        self.depth = 0
+
+        for depth in range(1, search.max_depth + 1):
+            try:
+                scored = [(search.score_move(game, move, depth), move)
+                          for move in moves]
+            except SearchTimeout:
+                break
+            # Stable, so equal scores keep the previous iteration's order
+            scored.sort(key=lambda entry: -entry[0])
+            moves = [move for score, move in scored]
+            results = [MoveAnalysis(move, score, depth,
+                                    self.principal_variation(game, move,
+                                                             depth))
+                       for score, move in scored]
+            self.depth = depth
+            if all(abs(score) >= WIN_BOUND for score, move in scored):
+                break
+
+        self.nodes = search.nodes
+        self.elapsed = time.perf_counter() - start
+        return self._with_symmetric(results, stabilizer)
+
+    def _with_symmetric(self, results, stabilizer):
+        """Adds the symmetric images of the analyzed moves, in rank order."""
+        if len(stabilizer) == 1:
+            return results
+        complete = []
+        seen = set()
+        for result in results:
+            for t in stabilizer:
+                image = CELL_MAPS[t][result.move]
+                if image not in seen:
+                    seen.add(image)
+                    complete.append(result._replace(
+                        move=image,
+                        pv=tuple(CELL_MAPS[t][move] for move in result.pv)))
+        return complete
+
+    def principal_variation(self, game, move, length):
+        """Follows the table's best moves from a root move.
+
+        Args:
+            game: The root position. It is restored before returning.
+            move: The root move.
+            length: The most moves to follow, the root move included.
+
+        Return:
+            A tuple of encoded moves starting with move.
+        """
+        table = self.search.table
+        line = [move]
+        game.make_move(move)
+        while (table is not None and len(line) < length
+               and game.winner is None):
+            entry = table.probe(game.hash)
+            if entry is None or entry[3] < 0:
+                break
+            best = entry[3]
+            if not game.is_legal(best // 9, best % 9):
+                break
+            game.make_move(best)
+            line.append(best)
+        for played in line:
+            game.undo()
+        return tuple(line)
+
+
+def to_record(game, results):
+    """Converts the analysis of a position to a JSON serializable record."""
+    return {
+        'position': to_notation(game),
+        'moves': [{'move': result.move, 'inner': result.move // 9,
+                   'space': result.move % 9, 'score': result.score,
+                   'depth': result.depth, 'pv': list(result.pv)}
+                  for result in results],
+    }
+
+
+def _init_worker(options):
+    """Creates the worker's Analyzer."""
+    global _worker_analyzer
+    _worker_analyzer = Analyzer(**options)
+
+
+def _analyze_position(position):
+    """Analyzes a position in a worker process.
+
+    Args:
+        position: A position in text notation or packed by pack_position.
+
+    Return:
+        The analysis record of the position, see to_record, or a record of
+        the position, in hex if packed, and the error if it is malformed.
+    """
+    try:
+        if isinstance(position, str):
+            game = from_notation(position)
+        else:
+            game = unpack_position(position)
+    except ValueError as exc:
+        if not isinstance(position, str):
+            position = bytes(position).hex()
+        return {'position': position, 'error': str(exc)}
+    return to_record(game, _worker_analyzer.analyze(game))
+
+
+def read_batch(path):
+    """Streams the positions of a batch file.
+
+    A file of packed positions written by write_positions yields them
+    packed, any other file is read as one position in text notation per
+    line, skipping blank lines and lines starting with '#'.
+    """
+    with open(path, 'rb') as f:
+        packed = f.read(len(POSITIONS_MAGIC)) == POSITIONS_MAGIC
+    if packed:
+        yield from read_positions(path)
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def analyze_batch(positions, options=None, workers=None, pending=None):
+    """Analyzes a stream of positions across worker processes.
+
+    At most pending positions are in flight at once, so positions are read
+    only as fast as they are analyzed, and the records arrive in the
+    order of the positions.
+
+    Args:
+        positions: An iterable of positions in text notation or packed by
+          pack_position.
+        options: The keyword arguments of every worker's Analyzer.
+        workers: The number of worker processes, None for one per CPU and
+          1 to analyze every position in this process.
+        pending: The most positions in flight, None for four per worker.
+
+    Yields:
+        The analysis record of each position, see to_record. A malformed
+        position yields a record of the position and its 'error' instead,
+        so the records stay aligned with the positions.
+    """
+    if workers == 1:
+        _init_worker(options or {})
+        for position in positions:
+            yield _analyze_position(position)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(options or {},)) as executor:
+        pending = pending or 4 * (workers or os.cpu_count() or 1)
+        futures = collections.deque()
+        for position in positions:
+            futures.append(executor.submit(_analyze_position, position))
+            if len(futures) >= pending:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def format_analysis(results, limit=None):
+    """Formats ranked moves as a table for the console."""
+    lines = ['rank  move  inner space     score depth  pv']
+    for rank, result in enumerate(results[:limit], 1):
+        score = '-' if result.score is None else str(result.score)
+        lines.append('{:>4}  {:>4}  {:>5} {:>5} {:>9} {:>5}  {}'.format(
+            rank, result.move, result.move // 9, result.move % 9, score,
+            result.depth, ' '.join(str(move) for move in result.pv)))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Analyzes one position, or a file of positions, from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Score every legal move of Ultimate Tic-Tac-Toe '
+                    'positions.')
+    parser.add_argument('position', nargs='?', default='9/9/9/9/9/9/9/9/9 X -',
+                        help="text notation, e.g. '9/9/9/9/4X4/9/9/9/9 O 4'")
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='seconds per position')
+    parser.add_argument('--node-limit', type=int, default=None,
+                        help='nodes per position')
+    parser.add_argument('--weights', help='evaluation weights file')
+    parser.add_argument('--top', type=int, default=None,
+                        help='moves to print, default all')
+    parser.add_argument('--batch', help='file of positions, one in text '
+                        'notation per line or packed by GameRecord')
+    parser.add_argument('-o', '--out', help='JSON lines file for the batch '
+                        'records, default standard output')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker processes, default one per CPU')
+    args = parser.parse_args(argv)
+
+    options = {'max_depth': args.depth, 'time_limit': args.time_limit,
+               'node_limit': args.node_limit}
+    if args.weights:
+        from Evaluation import load_weights
+        options['weights'] = load_weights(args.weights)
+
+    if args.batch:
+        out = open(args.out, 'w') if args.out else sys.stdout
+        try:
+            for record in analyze_batch(read_batch(args.batch), options,
+                                        args.workers):
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return 0
+
+    game = from_notation(args.position)
+    if game.winner is not None:
+        print('The game is over: {}'.format(game.winner))
+        return 0
+    analyzer = Analyzer(**options)
+    results = analyzer.analyze(game)
+    print('{} legal moves, depth {}, {} nodes in {:.2f}s'.format(
+        len(results), analyzer.depth, analyzer.nodes, analyzer.elapsed))
+    print(format_analysis(results, args.top))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,415 @@
+import argparse
+import csv
+import json
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from GameState import GameState, MARKERS, TIE
+from TictacPlayer import TictacPlayer
+
+
+class Engine:
+    """The interface of a player that the Arena can pit against another.
+
+    Attributes:
+        name: A short name identifying the engine in results.
+    """
+    name = 'engine'
+
+    def new_game(self, seed):
+        """Prepares the engine for a new game.
+
+        Args:
+            seed: A per game seed for any randomness the engine uses.
+        """
+
+    def choose_move(self, game):
+        """Selects a move for the player to move.
+
+        Args:
+            game: The position to move in. It must be left unchanged.
+
+        Return:
+            The selected move encoded as inner * 9 + space.
+        """
+        raise NotImplementedError
+
+
+class RandomEngine(Engine):
+    """An engine that plays uniformly random legal moves."""
+    name = 'random'
+
+    def __init__(self):
+        self.rand = random.Random()
+
+    def new_game(self, seed):
+        self.rand.seed(seed)
+
+    def choose_move(self, game):
+        return game.random_move(self.rand.random)
+
+
+class TictacEngine(Engine):
+    """An engine that selects moves with a TictacPlayer in any of its modes.
+
+    Attributes:
+        player: The TictacPlayer making the decisions.
+    """
+
+    def __init__(self, mode='greedy', **options):
+        """Creates the TictacPlayer with the given mode and options."""
+        self.name = mode
+        self.options = options
+        self.player = TictacPlayer(mode, **options)
+
+    def new_game(self, seed):
+        # Start each game with a fresh MCTS tree and transposition table
+        self.player = TictacPlayer(self.name, **self.options)
+
+    def choose_move(self, game):
+        if self.player.game is not game:
+            self.player.attach(game)
+        self.player.my_marker = MARKERS[game.player]
+        self.player.op_marker = MARKERS[1 - game.player]
+        return self.player.choose_move(game.target)
+
+
+# Factories for the engines that can be named in the Arena
+ENGINES = {
+    'random': lambda **options: RandomEngine(),
+    'greedy': lambda **options: TictacEngine('greedy', **options),
+    'alphabeta': lambda **options: TictacEngine('alphabeta', **options),
+    'mcts': lambda **options: TictacEngine('mcts', **options),
+}
+
+# Fields of each game record, in CSV column order
+FIELDS = ('game', 'seed', 'x', 'o', 'winner', 'score_a', 'moves',
+          'a_ms_mean', 'a_ms_max', 'b_ms_mean', 'b_ms_max', 'move_ms')
+
+# Engines created in this process, keyed by name, options and side
+_engines = {}
+
+
+def make_engine(name, options=None):
+    """Creates a named engine from ENGINES.
+
+    Raises:
+        ValueError: The engine name is unknown.
+    """
+    if name not in ENGINES:
+        raise ValueError('Unknown engine {}, expected one of {}'.format(
+            name, sorted(ENGINES)))
+    return ENGINES[name](**(options or {}))
+
+
+def cached_engine(name, options, side=None):
+    """Returns this process's engine for the name and options.
+
+    Each side of a match gets its own engine, so that two sides with the
+    same name and options never share a search tree, table or monitor.
+    """
+    key = (name, tuple(sorted((options or {}).items())), side)
+    if key not in _engines:
+        _engines[key] = make_engine(name, options)
+    return _engines[key]
+
+
+def play_game(engine_x, engine_o):
+    """Plays one game between two engines, 'X' moving first.
+
+    Return:
+        A tuple of the winning marker ('T' for a tie), the moves played and
+        the milliseconds each move took to choose.
+    """
+    game = GameState()
+    engines = (engine_x, engine_o)
+    moves, move_ms = [], []
+    while game.winner is None:
+        start = time.perf_counter()
+        move = engines[game.player].choose_move(game)
+        move_ms.append((time.perf_counter() - start) * 1000)
+        game.make_move(move)
+        moves.append(move)
+    return game.winner, moves, move_ms
+
+
+def split_move_ms(record):
+    """Splits a record's move latencies into engine A's and engine B's.
+
+    Engine A made the even numbered moves when it played 'X', which it does
+    in even numbered games.
+
+    Return:
+        A tuple of engine A's and engine B's move latencies.
+    """
+    a_first = record['game'] % 2 == 0
+    move_ms = record['move_ms']
+    return move_ms[0 if a_first else 1::2], move_ms[1 if a_first else 0::2]
+
+
+def run_game(index, seed, spec_a, spec_b):
+    """Plays game number index of a match, alternating who moves first.
+
+    Engine A plays 'X' (and moves first) in even numbered games.
+
+    Args:
+        index: The number of the game within the match.
+        seed: The seed for the game's randomness.
+        spec_a: A tuple of engine A's name and options.
+        spec_b: A tuple of engine B's name and options.
+
+    Return:
+        A game record with the keys in FIELDS.
+    """
+    random.seed(seed)
+    a, b = cached_engine(*spec_a, 'a'), cached_engine(*spec_b, 'b')
+    a.new_game(seed)
+    b.new_game(seed)
+    a_first = index % 2 == 0
+    engine_x, engine_o = (a, b) if a_first else (b, a)
+    winner, moves, move_ms = play_game(engine_x, engine_o)
+
+    if winner == TIE:
+        score_a = 0.5
+    else:
+        score_a = 1.0 if (winner == MARKERS[0]) == a_first else 0.0
+    record = {
+        'game': index,
+        'seed': seed,
+        'x': spec_a[0] if a_first else spec_b[0],
+        'o': spec_b[0] if a_first else spec_a[0],
+        'winner': winner,
+        'score_a': score_a,
+        'moves': len(moves),
+        'move_ms': [round(ms, 3) for ms in move_ms],
+    }
+    a_ms, b_ms = split_move_ms(record)
+    record['a_ms_mean'] = sum(a_ms) / len(a_ms) if a_ms else 0.0
+    record['a_ms_max'] = max(a_ms, default=0.0)
+    record['b_ms_mean'] = sum(b_ms) / len(b_ms) if b_ms else 0.0
+    record['b_ms_max'] = max(b_ms, default=0.0)
+    return record
+
+
+class RecordWriter:
+    """Streams game records to a JSON lines or CSV file.
+
+    The format is chosen by the file extension: '.csv' for CSV, anything
+    else for JSON lines. Every record is flushed as it is written.
+    """
+
+    def __init__(self, path):
+        """Opens the file for writing."""
+        self.file = open(path, 'w', newline='')
+        self.csv = None
+        if path.endswith('.csv'):
+            self.csv = csv.DictWriter(self.file, FIELDS)
+            self.csv.writeheader()
+
+    def write(self, record):
+        """Writes one record."""
+        if self.csv is not None:
+            row = dict(record)
+            row['move_ms'] = ' '.join(str(ms) for ms in record['move_ms'])
+            self.csv.writerow(row)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        """Closes the file."""
+        self.file.close()
+
+
+def wilson_interval(successes, trials, z=1.96):
+    """Returns the Wilson score confidence interval of a proportion.
+
+    Args:
+        successes: The (possibly fractional) number of successes.
+        trials: The number of trials.
+        z: The standard normal quantile, 1.96 for 95% confidence.
+
+    Return:
+        A tuple of the lower and upper bound.
+    """
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials
+                           + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def summarize(records, elapsed):
+    """Summarizes the records of a match.
+
+    Args:
+        records: The game records.
+        elapsed: The wall clock seconds the match took.
+
+    Return:
+        A dictionary of results counts, win rates with 95% Wilson confidence
+        intervals, throughput and mean move latencies.
+    """
+    games = len(records)
+    a_wins = sum(1 for r in records if r['score_a'] == 1.0)
+    b_wins = sum(1 for r in records if r['score_a'] == 0.0)
+    ties = games - a_wins - b_wins
+    score = a_wins + 0.5 * ties
+    moves = sum(r['moves'] for r in records)
+    a_ms, b_ms = [], []
+    for record in records:
+        a, b = split_move_ms(record)
+        a_ms += a
+        b_ms += b
+    return {
+        'games': games,
+        'a_wins': a_wins,
+        'b_wins': b_wins,
+        'ties': ties,
+        'a_win_rate': a_wins / games if games else 0.0,
+        'a_win_ci': wilson_interval(a_wins, games),
+        'b_win_rate': b_wins / games if games else 0.0,
+        'b_win_ci': wilson_interval(b_wins, games),
+        'a_score': score / games if games else 0.0,
+        'a_score_ci': wilson_interval(score, games),
+        'elapsed': elapsed,
+        'games_per_sec': games / elapsed if elapsed else 0.0,
+        'moves_per_sec': moves / elapsed if elapsed else 0.0,
+        'a_ms_mean': sum(a_ms) / len(a_ms) if a_ms else 0.0,
+        'b_ms_mean': sum(b_ms) / len(b_ms) if b_ms else 0.0,
+    }
+
+
+def format_summary(name_a, name_b, summary):
+    """Formats a match summary for the console."""
+    return '\n'.join([
+        '{} vs {}: {} games in {:.1f}s ({:.2f} games/sec, {:.0f} moves/sec)'
+        .format(name_a, name_b, summary['games'], summary['elapsed'],
+                summary['games_per_sec'], summary['moves_per_sec']),
+        '  {} wins {:.1%} [{:.1%}, {:.1%}], mean move {:.2f}ms'.format(
+            name_a, summary['a_win_rate'], *summary['a_win_ci'],
+            summary['a_ms_mean']),
+        '  {} wins {:.1%} [{:.1%}, {:.1%}], mean move {:.2f}ms'.format(
+            name_b, summary['b_win_rate'], *summary['b_win_ci'],
+            summary['b_ms_mean']),
+        '  ties {}, {} score {:.1%} [{:.1%}, {:.1%}]'.format(
+            summary['ties'], name_a, summary['a_score'],
+            *summary['a_score_ci']),
+    ])
+
+
+class Arena:
+    """Plays headless matches between two engines across worker processes.
+
+    Attributes:
+        spec_a: Engine A's name and options.
+        spec_b: Engine B's name and options.
+        workers: The number of worker processes, None for one per CPU and 1
+          to play every game in this process.
+    """
+
+    def __init__(self, engine_a, engine_b, options_a=None, options_b=None,
+                 workers=None):
+        """Initializes the match between two engines named in ENGINES.
+
+        Raises:
+            ValueError: An engine name is unknown.
+        """
+        for name in (engine_a, engine_b):
+            if name not in ENGINES:
+                raise ValueError('Unknown engine {}, expected one of {}'
+                                 .format(name, sorted(ENGINES)))
+        self.spec_a = (engine_a, options_a or {})
+        self.spec_b = (engine_b, options_b or {})
+        self.workers = workers
+
+    def games(self, count, seed=0):
+        """Plays a match, yielding each game record as it finishes.
+
+        Records arrive in completion order when playing across processes.
+
+        Args:
+            count: The number of games to play.
+            seed: The seed of the first game; game i uses seed + i.
+        """
+        if self.workers == 1:
+            for index in range(count):
+                yield run_game(index, seed + index, self.spec_a, self.spec_b)
+            return
+        with ProcessPoolExecutor(self.workers) as executor:
+            futures = [executor.submit(run_game, index, seed + index,
+                                       self.spec_a, self.spec_b)
+                       for index in range(count)]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run(self, count, out=None, seed=0):
+        """Plays a match, streaming records to a file, and summarizes it.
+
+        Args:
+            count: The number of games to play.
+            out: A '.jsonl' or '.csv' path to stream the records to, or None.
+            seed: The seed of the first game.
+
+        Return:
+            The match summary, see summarize.
+        """
+        writer = RecordWriter(out) if out else None
+        records = []
+        start = time.perf_counter()
+        try:
+            for record in self.games(count, seed):
+                records.append(record)
+                if writer is not None:
+                    writer.write(record)
+        finally:
+            if writer is not None:
+                writer.close()
+        return summarize(records, time.perf_counter() - start)
+
+
+def main(argv=None):
+    """Runs a match from the command line and prints its summary."""
+    parser = argparse.ArgumentParser(
+        description='Play headless Ultimate Tic-Tac-Toe matches.')
+    parser.add_argument('engine_a', choices=sorted(ENGINES))
+    parser.add_argument('engine_b', choices=sorted(ENGINES))
+    parser.add_argument('-n', '--games', type=int, default=100)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker processes, default one per CPU')
+    parser.add_argument('-o', '--out', help='.jsonl or .csv record file')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-limit', type=float, default=0.1,
+                        help='seconds per move for searching engines')
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--playouts', type=int, default=None)
+    parser.add_argument('--metrics', help='JSON lines file to append the '
+                        'per move metrics of searching engines to')
+    parser.add_argument('--weights-a', help="evaluation weights file of "
+                        "engine A's searches")
+    parser.add_argument('--weights-b', help="evaluation weights file of "
+                        "engine B's searches")
+    args = parser.parse_args(argv)
+
+    options = {'time_limit': args.time_limit, 'max_depth': args.depth}
+    if args.playouts is not None:
+        options['playout_limit'] = args.playouts
+    if args.metrics:
+        options['monitor'] = args.metrics
+    options_a, options_b = dict(options), dict(options)
+    if args.weights_a:
+        options_a['weights'] = args.weights_a
+    if args.weights_b:
+        options_b['weights'] = args.weights_b
+    arena = Arena(args.engine_a, args.engine_b, options_a, options_b,
+                  args.workers)
+    summary = arena.run(args.games, args.out, args.seed)
+    print(format_summary(args.engine_a, args.engine_b, summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import collections
+import numpy as np
+from GameState import *
+
+# LINES as an index array for gathering the three spaces of every line
+LINE_INDEX = np.array(LINES)
+SCORE_TABLE = np.array(LINE_SCORES)
+SPACE_BITS = np.arange(9, dtype=np.uint16)
+
+BatchResult = collections.namedtuple(
+    'BatchResult', ['scores', 'winners', 'inner_status'])
+BatchResult.__doc__ = """The evaluation of a batch of N positions.
+
+Attributes:
+    scores: (N, 2) array of the game heuristic of each position for 'X' and
+      'O', the InnerBoard sum plus twice the condition board.
+    winners: (N,) array of status codes, UNDECIDED while the game is in
+      progress, X_WON, O_WON or TIED.
+    inner_status: (N, 9) array of the status code of every InnerBoard.
+"""
+
+
+def pack(games):
+    """Packs GameStates into an (N, 2, 9) array of marker masks.
+
+    Args:
+        games: An iterable of GameState objects.
+
+    Return:
+        A uint16 array where [n, player, inner] is the player's 9-bit mask of
+        InnerBoard inner in position n.
+    """
+    return np.array([game.cells for game in games], dtype=np.uint16)
+
+
+def as_cells(positions):
+    """Converts positions to an (N, 9, 9) array of cell values.
+
+    Args:
+        positions: Either an (N, 9, 9) array where [n, inner, space] is 0 for
+          an empty space, 1 for 'X' and 2 for 'O', or an (N, 2, 9) array of
+          masks as returned by pack.
+
+    Return:
+        An int8 array of cell values.
+
+    Raises:
+        ValueError: The array has neither shape.
+    """
+    positions = np.asarray(positions)
+    if positions.ndim == 3 and positions.shape[1:] == (9, 9):
+        return positions.astype(np.int8, copy=False)
+    if positions.ndim == 3 and positions.shape[1:] == (2, 9):
+        bits = (positions[..., None].astype(np.uint16) >> SPACE_BITS) & 1
+        return (bits[:, 0] + 2 * bits[:, 1]).astype(np.int8)
+    raise ValueError('Expected an (N, 9, 9) or (N, 2, 9) array, got {}'
+                     .format(positions.shape))
+
+
+def line_counts(cells):
+    """Counts each player's markers in every line of every board.
+
+    Args:
+        cells: An (..., 9) array of cell values for any number of boards.
+
+    Return:
+        An (..., 8, 2) array of the number of 'X' and 'O' markers in each of
+        the 8 lines.
+    """
+    lines = cells[..., LINE_INDEX]
+    return np.stack([(lines == 1).sum(-1), (lines == 2).sum(-1)], axis=-1)
+
+
+def board_status(cells, counts):
+    """Determines the status of every board from its cells and line counts.
+
+    Return:
+        An array of status codes with the shape of cells without its last
+        axis.
+    """
+    status = np.full(cells.shape[:-1], UNDECIDED, dtype=np.int8)
+    status[(cells != 0).all(-1)] = TIED
+    status[(counts[..., 1] == 3).any(-1)] = O_WON
+    status[(counts[..., 0] == 3).any(-1)] = X_WON
+    return status
+
+
+def board_heuristics(counts):
+    """Scores the open lines of every board for both players.
+
+    Return:
+        An array of the line heuristic for 'X' and 'O' with the shape of
+        counts without its line axis.
+    """
+    x, o = counts[..., 0], counts[..., 1]
+    score_x = np.where(o == 0, SCORE_TABLE[x], 0).sum(-1)
+    score_o = np.where(x == 0, SCORE_TABLE[o], 0).sum(-1)
+    return np.stack([score_x, score_o], axis=-1)
+
+
+def evaluate_batch(positions):
+    """Evaluates many positions at once with vectorized operations.
+
+    The spaces of every line are gathered with LINE_INDEX, counted per
+    player, and reduced into each InnerBoard's status and heuristic. The
+    condition board is built from the InnerBoard results and scored the
+    same way. The results match GameState.heuristic and
+    GameState.winner for every position.
+
+    Args:
+        positions: An (N, 9, 9) array of cell values or an (N, 2, 9) array of
+          masks, see as_cells.
+
+    Return:
+        A BatchResult for the N positions.
+    """
+    cells = as_cells(positions)
+    counts = line_counts(cells)
+    inner_status = board_status(cells, counts)
+
+    condition = np.where(inner_status == X_WON, 1,
+                         np.where(inner_status == O_WON, 2, 0))
+    condition_counts = line_counts(condition)
+    scores = (board_heuristics(counts).sum(1)
+              + 2 * board_heuristics(condition_counts))
+
+    winners = np.full(len(cells), UNDECIDED, dtype=np.int8)
+    winners[(inner_status != UNDECIDED).all(-1)] = TIED
+    winners[(condition_counts[..., 1] == 3).any(-1)] = O_WON
+    winners[(condition_counts[..., 0] == 3).any(-1)] = X_WON
+    return BatchResult(scores, winners, inner_status)
@@ -0,0 +1,365 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from GameState import GameState
+from SearchMonitor import percentile
+from TictacPlayer import TictacPlayer
+
+# Ranges of plies played from the empty board for each phase of the corpus
+PHASES = {
+    'early': (2, 10),
+    'mid': (20, 35),
+    'late': (45, 60),
+}
+
+# Target duration of one timing sample, over which fast calls are repeated
+SAMPLE_SECONDS = 0.001
+
+# The modules short-lived worker processes import, the budget in
+# milliseconds for importing each (dependencies included), and the modules
+# none of them may pull in
+CORE_MODULES = ('GameState', 'Search', 'TictacPlayer')
+IMPORT_BUDGET_MS = 30.0
+HEAVY_MODULES = ('numpy', 'multiprocessing', 'concurrent.futures', 'json',
+                 'threading')
+
+
+def build_corpus(per_phase=10, seed=0):
+    """Builds a reproducible corpus of positions from each phase of the game.
+
+    Positions are reached by seeded random play; games that end before the
+    phase's ply count are replayed with the next seed.
+
+    Args:
+        per_phase: The number of positions in each phase.
+        seed: The seed of the first game.
+
+    Return:
+        A dictionary mapping each phase to a list of GameState encodings.
+    """
+    rand = random.Random(seed)
+    corpus = {}
+    for phase, (low, high) in PHASES.items():
+        positions = []
+        while len(positions) < per_phase:
+            plies = rand.randint(low, high)
+            game = GameState()
+            while len(game.history) < plies and game.winner is None:
+                game.make_move(game.random_move(rand.random))
+            if game.winner is None:
+                positions.append(game.encode())
+        corpus[phase] = positions
+    return corpus
+
+
+def _player_for(code):
+    """Returns a TictacPlayer attached to a corpus position, to move."""
+    game = GameState.decode(code)
+    player = TictacPlayer()
+    player.attach(game)
+    player.my_marker = player.markers[game.player]
+    player.op_marker = player.markers[1 - game.player]
+    return player
+
+
+def _hot_paths(player, depth):
+    """Returns the hot path callables for a player's position.
+
+    Each callable leaves the position unchanged.
+    """
+    game = player.game
+    target = game.target
+    inner = target if target >= 0 else game.open_boards()[0]
+    x, y = player.calculate_pos(inner)
+    board = player.board[x][y]
+    move = game.legal_moves()[0]
+    searcher = TictacPlayer('alphabeta', time_limit=None, max_depth=depth)
+    searcher.attach(game)
+    searcher.my_marker, searcher.op_marker = player.my_marker, player.op_marker
+
+    def make_undo():
+        game.make_move(move)
+        game.undo()
+
+    def take_turn():
+        player.take_turn(target)
+        player.revert_move()
+
+    def take_turn_alphabeta():
+        # A fresh table each call keeps the work identical between samples
+        searcher.searcher.table.clear()
+        searcher.take_turn(target)
+        searcher.revert_move()
+
+    return {
+        'legal_moves': game.legal_moves,
+        'make_undo': make_undo,
+        'succ': lambda: list(player.succ(target)),
+        'inner_succ': lambda: list(player.inner_succ(x, y)),
+        'heuristic': player.heuristic,
+        'inner_heuristic': lambda: board.inner_heuristic(player.my_marker,
+                                                         player.op_marker),
+        'validate': board.validate,
+        'take_turn': take_turn,
+        'take_turn_alphabeta': take_turn_alphabeta,
+    }
+
+
+def time_calls(functions, repeat=5):
+    """Times calls to each function in a list.
+
+    Every function is sampled repeat times. A sample repeats the call enough
+    times to last about SAMPLE_SECONDS, and the sample's mean is taken as
+    one latency measurement, so the timer's own overhead stays negligible.
+
+    Return:
+        A dictionary of the total calls, ops/sec and p50/p99 latency in
+        microseconds.
+    """
+    latencies = []
+    calls = 0
+    total = 0.0
+    timer = time.perf_counter
+    for function in functions:
+        start = timer()
+        function()
+        number = max(1, int(SAMPLE_SECONDS / max(timer() - start, 1e-9)))
+        for sample in range(repeat):
+            start = timer()
+            for call in range(number):
+                function()
+            elapsed = timer() - start
+            latencies.append(elapsed / number)
+            calls += number
+            total += elapsed
+    latencies.sort()
+    return {
+        'calls': calls,
+        'ops_per_sec': calls / total if total else 0.0,
+        'p50_us': percentile(latencies, 0.50) * 1e6,
+        'p99_us': percentile(latencies, 0.99) * 1e6,
+    }
+
+
+def perft(game, depth):
+    """Counts the leaf nodes of the legal move tree to the given depth."""
+    if depth == 0 or game.winner is not None:
+        return 1
+    if depth == 1:
+        return len(game.legal_moves())
+    nodes = 0
+    for move in game.legal_moves():
+        game.make_move(move)
+        nodes += perft(game, depth - 1)
+        game.undo()
+    return nodes
+
+
+def run_perft(max_depth=4, code=None):
+    """Runs perft at every depth from 1 to max_depth.
+
+    Args:
+        max_depth: The deepest perft to run.
+        code: The encoded start position, the empty board if None.
+
+    Return:
+        A list of dictionaries of the depth, nodes, seconds and nodes/sec.
+    """
+    game = GameState() if code is None else GameState.decode(code)
+    results = []
+    for depth in range(1, max_depth + 1):
+        start = time.perf_counter()
+        nodes = perft(game, depth)
+        elapsed = time.perf_counter() - start
+        results.append({'depth': depth, 'nodes': nodes, 'seconds': elapsed,
+                        'nodes_per_sec': nodes / elapsed if elapsed else 0.0})
+    return results
+
+
+def measure_imports(modules=CORE_MODULES, repeat=5):
+    """Measures the import time of modules in fresh interpreters.
+
+    Each module is imported repeat times with python -X importtime, which
+    times the import itself without the interpreter's start up, and the
+    fastest import is kept. Bytecode caching is allowed, as it is for
+    worker processes.
+
+    Return:
+        A dictionary mapping each module to its import milliseconds and the
+        HEAVY_MODULES it pulled in.
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    script = 'import sys, {0}; print(" ".join(m for m in {1!r} ' \
+             'if m in sys.modules))'
+    results = {}
+    for module in modules:
+        best = float('inf')
+        heavy = []
+        for attempt in range(repeat):
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c',
+                 script.format(module, HEAVY_MODULES)],
+                cwd=directory, env=env, capture_output=True, text=True,
+                check=True)
+            heavy = process.stdout.split()
+            for line in process.stderr.splitlines():
+                fields = line.split('|')
+                if len(fields) == 3 and fields[2].strip() == module:
+                    best = min(best, int(fields[1]) / 1000)
+        results[module] = {'ms': best, 'heavy': heavy}
+    return results
+
+
+def run_benchmarks(per_phase=10, seed=0, repeat=5, perft_depth=4,
+                   search_depth=3):
+    """Runs the benchmark suite over a seeded corpus.
+
+    Args:
+        per_phase: The number of corpus positions in each phase.
+        seed: The corpus seed.
+        repeat: The number of timing samples per position.
+        perft_depth: The deepest perft to run from the empty board.
+        search_depth: The fixed depth of the take_turn_alphabeta benchmark.
+
+    Return:
+        A JSON serializable dictionary of the environment, the per hot path
+        and phase timings, and the perft results.
+    """
+    corpus = build_corpus(per_phase, seed)
+    benchmarks = {}
+    for phase, positions in corpus.items():
+        paths = [_hot_paths(_player_for(code), search_depth)
+                 for code in positions]
+        for name in paths[0]:
+            benchmarks.setdefault(name, {})[phase] = time_calls(
+                [path[name] for path in paths], repeat)
+    return {
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'settings': {'per_phase': per_phase, 'seed': seed, 'repeat': repeat,
+                     'search_depth': search_depth},
+        'benchmarks': benchmarks,
+        'perft': run_perft(perft_depth),
+        'imports': measure_imports(),
+    }
+
+
+def compare(baseline, current, threshold=0.10):
+    """Compares two benchmark results and flags regressions.
+
+    A hot path regresses when its median throughput (from the p50 latency,
+    which is less sensitive to machine noise than the mean) drops by more
+    than threshold. Differing perft node counts mean move generation
+    changed, and are always flagged, as are core imports over
+    IMPORT_BUDGET_MS or pulling in HEAVY_MODULES.
+
+    Args:
+        baseline: The earlier result of run_benchmarks.
+        current: The later result of run_benchmarks.
+        threshold: The tolerated fractional slowdown.
+
+    Return:
+        A tuple of a list of report lines and a list of regression lines.
+        Changes are reported as the speedup in median throughput.
+    """
+    report, regressions = [], []
+    for name, phases in sorted(current['benchmarks'].items()):
+        for phase, stats in phases.items():
+            old = baseline['benchmarks'].get(name, {}).get(phase)
+            if old is None:
+                continue
+            change = old['p50_us'] / stats['p50_us'] - 1
+            line = '{:<20} {:<5} {:>10.2f} -> {:>10.2f} p50 us ({:+.1%})'
+            line = line.format(name, phase, old['p50_us'], stats['p50_us'],
+                               change)
+            report.append(line)
+            if change < -threshold:
+                regressions.append(line)
+
+    old_perft = {r['depth']: r['nodes'] for r in baseline['perft']}
+    for result in current['perft']:
+        expected = old_perft.get(result['depth'])
+        if expected is not None and expected != result['nodes']:
+            regressions.append('perft({}) = {}, expected {}'.format(
+                result['depth'], result['nodes'], expected))
+
+    for module, result in current.get('imports', {}).items():
+        if result['ms'] > IMPORT_BUDGET_MS:
+            regressions.append('import {} took {:.1f}ms, budget {:.0f}ms'
+                               .format(module, result['ms'],
+                                       IMPORT_BUDGET_MS))
+        if result['heavy']:
+            regressions.append('import {} pulled in {}'.format(
+                module, ', '.join(result['heavy'])))
+    return report, regressions
+
+
+def format_results(results):
+    """Formats benchmark results for the console."""
+    lines = ['{:<20} {:<5} {:>12} {:>10} {:>10}'.format(
+        'hot path', 'phase', 'ops/sec', 'p50 us', 'p99 us')]
+    for name, phases in results['benchmarks'].items():
+        for phase, stats in phases.items():
+            lines.append('{:<20} {:<5} {:>12.0f} {:>10.2f} {:>10.2f}'.format(
+                name, phase, stats['ops_per_sec'], stats['p50_us'],
+                stats['p99_us']))
+    for result in results['perft']:
+        lines.append('perft({}) = {} ({:.0f} nodes/sec)'.format(
+            result['depth'], result['nodes'], result['nodes_per_sec']))
+    for module, result in results.get('imports', {}).items():
+        lines.append('import {} {:.1f}ms{}'.format(
+            module, result['ms'], ' (pulls in {})'.format(
+                ', '.join(result['heavy'])) if result['heavy'] else ''))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Runs the benchmark suite from the command line.
+
+    Return:
+        1 if a comparison found regressions, otherwise 0.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Ultimate Tic-Tac-Toe hot paths.')
+    parser.add_argument('-o', '--out', help='JSON file to save results to')
+    parser.add_argument('-c', '--compare', help='baseline JSON to compare to')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    parser.add_argument('--positions', type=int, default=10,
+                        help='corpus positions per phase')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--perft-depth', type=int, default=4)
+    parser.add_argument('--search-depth', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.positions, args.seed, args.repeat,
+                             args.perft_depth, args.search_depth)
+    print(format_results(results))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report, regressions = compare(baseline, results, args.threshold)
+        print('\n'.join(report))
+        if regressions:
+            print('Regressions:')
+            print('\n'.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import importlib
+import sys
+
+# Every subcommand's module, the name of its entry point taking the
+# remaining arguments, and its description. A subcommand's module is only
+# imported once the subcommand is chosen, so starting any one of them costs
+# only the imports it needs.
+COMMANDS = {
+    'play': ('TictacPlayer', 'main', 'play against the AI in the console'),
+    'selfplay': ('Arena', 'main', 'play headless engine-vs-engine matches'),
+    'bench': ('Benchmark', 'main', 'benchmark the hot paths'),
+    'analyze': ('Analysis', 'main', 'score every legal move of positions'),
+    'serve': ('GameServer', 'main', 'host games over JSON lines'),
+    'book': ('OpeningBook', 'main', 'build or probe an opening book'),
+    'records': ('GameRecord', 'main', 'inspect positions and game records'),
+    'metrics': ('SearchMonitor', 'main', 'aggregate per-move metrics'),
+    'tune': ('Tuner', 'main', 'tune the evaluation weights'),
+}
+
+USAGE = 'usage: python CommandLine.py <command> [options]'
+
+
+def usage():
+    """Returns the list of subcommands for --help."""
+    lines = [USAGE, '', 'Ultimate Tic-Tac-Toe engine and tools.', '',
+             'commands:']
+    for name, (module, function, description) in COMMANDS.items():
+        lines.append('  {:<10} {}'.format(name, description))
+    lines.append('')
+    lines.append("Run 'python CommandLine.py <command> -h' for its options.")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Runs the chosen subcommand with the remaining arguments.
+
+    Return:
+        The subcommand's exit status.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0
+    command = argv[0]
+    if command not in COMMANDS:
+        print('{}\nUnknown command {}, expected one of {}'.format(
+            USAGE, command, ', '.join(COMMANDS)), file=sys.stderr)
+        return 2
+    module, function, description = COMMANDS[command]
+    entry = getattr(importlib.import_module(module), function)
+    return entry(argv[1:]) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+from GameState import BITS, TIE
+
+
+class ConsoleView:
+    """Prints game announcements for the interactive game loop.
+
+    The game engine and the AI player never print; the interactive loop
+    asks this view to announce what has changed after each move, so that
+    evaluation and search stay free of console I/O.
+
+    Attributes:
+        announced: Bitmask of the InnerBoards whose result has been printed.
+    """
+
+    def __init__(self):
+        """Initializes the view with no results announced."""
+        self.announced = 0
+
+    def announce_first(self, ai_first):
+        """Prints which player will move first."""
+        if ai_first:
+            print('The AI goes first!')
+        else:
+            print('You go first!')
+
+    def announce_thinking(self):
+        """Prints that the AI is choosing its move."""
+        print('Assessing possible moves...')
+
+    def announce_move(self, game):
+        """Prints the most recent move applied to the game."""
+        player, inner, space = game.history[-1][:3]
+        print('I have decided to move to {}{}'.format(inner, space))
+
+    def announce_playouts(self, searcher):
+        """Prints the playout throughput of a MonteCarloSearch."""
+        print('Ran {} playouts ({:.0f}/sec)'.format(
+            searcher.playouts, searcher.playouts_per_second))
+
+    def announce_results(self, game):
+        """Prints InnerBoards decided since the last call and the game result.
+
+        Args:
+            game: The GameState to report on.
+
+        Return:
+            True if the game is over, otherwise False.
+        """
+        for index in BITS[game.decided & ~self.announced]:
+            winner = game.inner_winner(index)
+            if winner == TIE:
+                print('Inner board #{} is a tie.'.format(index))
+            else:
+                print('Congratulations! {} has won inner board #{}'.format(
+                    winner, index))
+        self.announced = game.decided
+
+        if game.winner is None:
+            return False
+        if game.winner == TIE:
+            print("The game is a tie!")
+        else:
+            print("Congratulations to {}! You've won the game!".format(
+                game.winner))
+        return True
@@ -0,0 +1,101 @@
+import collections
+from GameState import *
+from Search import *
+from Symmetry import symmetries, unique_moves
+
+# Results of a solved position for the player to move
+WIN = 'win'
+DRAW = 'draw'
+LOSS = 'loss'
+
+Solution = collections.namedtuple('Solution', ['move', 'result', 'distance'])
+Solution.__doc__ = """The proven outcome of a position.
+
+Attributes:
+    move: The encoded move that achieves the result.
+    result: WIN, DRAW or LOSS for the player to move, with perfect play.
+    distance: For a win or loss, the number of plies until the game ends
+      with perfect play, the "mate in N" distance; wins are as fast and
+      losses as slow as possible. None for a draw.
+"""
+
+
+class EndgameSolver(AlphaBetaSearch):
+    """An exact win/loss/draw solver for positions near the end of the game.
+
+    Once few empty spaces or undecided InnerBoards remain, the solver
+    searches to the end of the game instead of a heuristic horizon. Every
+    ply fills an empty space, so searching as deep as there are empty spaces
+    never reaches a heuristic leaf, and the only scores are wins and losses
+    at a distance and draws. Solved positions are kept in the solver's own
+    TranspositionTable, and a node budget bounds the time per move.
+
+    Attributes:
+        empty_threshold: The solver applies at or below this many empty
+          spaces in undecided InnerBoards.
+        board_threshold: The solver applies at or below this many undecided
+          InnerBoards.
+        solution: The Solution of the most recent solve, None if it ran out
+          of budget.
+    """
+
+    def __init__(self, empty_threshold=16, board_threshold=2,
+                 node_limit=200000, time_limit=None, table=None):
+        """Initializes the solver with its thresholds and budget."""
+        AlphaBetaSearch.__init__(self, 81, time_limit, node_limit, table)
+        self.empty_threshold = empty_threshold
+        self.board_threshold = board_threshold
+        self.solution = None
+
+    def applies(self, game):
+        """Returns True if the position is small enough to solve."""
+        if game.winner is not None:
+            return False
+        return (game.empty_cells() <= self.empty_threshold
+                or POPCOUNT[FULL & ~game.decided] <= self.board_threshold)
+
+    def evaluate(self, game):
+        """Never reached: the solver always searches to the end of the game.
+
+        Raises:
+            AssertionError: A search stopped short of a terminal position.
+        """
+        raise AssertionError('The endgame solver reached a heuristic leaf')
+
+    def solve(self, game):
+        """Proves the outcome of a position and finds a perfect move.
+
+        Args:
+            game: The position to solve. It is restored before returning.
+
+        Return:
+            A Solution, or None if the node or time budget ran out first or
+            there are no legal moves.
+        """
+        self.reset_budget()
+        self.solution = None
+        moves = unique_moves(self.order_moves(game), symmetries(game))
+        if not moves:
+            return None
+        base = len(game.history)
+        try:
+            move, score = self._root(game, moves, game.empty_cells())
+        except SearchTimeout:
+            while len(game.history) > base:
+                game.undo()
+            return None
+
+        if score > 0:
+            result, distance = WIN, WIN_SCORE - score
+        elif score < 0:
+            result, distance = LOSS, WIN_SCORE + score
+        else:
+            result, distance = DRAW, None
+        self.solution = Solution(move, result, distance)
+        self.score = score
+        return self.solution
+
+    def search(self, game):
+        """Returns the move of the solution, or None if it is unsolved."""
+        solution = self.solve(game)
+        return None if solution is None else solution.move
@@ -0,0 +1,153 @@
+import collections
+from array import array
+from GameState import *
+
+Weights = collections.namedtuple('Weights', [
+    'one', 'two', 'three', 'condition', 'center', 'corner', 'edge',
+    'freedom'])
+Weights.__doc__ = """The tunable weights of an Evaluator.
+
+Attributes:
+    one: Score of an open line holding one of a player's markers.
+    two: Score of an open line holding two of a player's markers.
+    three: Score of a completed line.
+    condition: Multiplier of the condition board's line score.
+    center: Multiplier of the centre InnerBoard's line score.
+    corner: Multiplier of each corner InnerBoard's line score.
+    edge: Multiplier of each edge InnerBoard's line score.
+    freedom: Bonus for the player to move when they may play in any
+      InnerBoard, having been sent to a decided one.
+"""
+
+# The weights of GameState.heuristic: LINE_SCORES, the condition board
+# weighted twice, every InnerBoard alike and no freedom bonus
+DEFAULT_WEIGHTS = Weights(*LINE_SCORES[1:], condition=2, center=1, corner=1,
+                          edge=1, freedom=0)
+
+# The name of the board weight applying to each InnerBoard
+BOARD_WEIGHTS = ('corner', 'edge', 'corner', 'edge', 'center', 'edge',
+                 'corner', 'edge', 'corner')
+
+# open_lines()[player][index] counts the lines of a configuration holding
+# one, two and three of the player's markers and none of the opponent's,
+# packed 4 bits each
+_open_lines = None
+
+
+def _count_lines(mine, theirs):
+    """Packs the counts of a player's open lines with 1, 2 and 3 markers."""
+    code = 0
+    for line in LINE_MASKS:
+        if not theirs & line:
+            count = POPCOUNT[mine & line]
+            if count:
+                code += 1 << 4 * (count - 1)
+    return code
+
+
+def open_lines():
+    """Returns the per player packed open line counts of every configuration.
+
+    The tables are built on the first call, so importing this module costs
+    nothing until an Evaluator is created.
+    """
+    global _open_lines
+    if _open_lines is None:
+        lines_x = array('H', [0]) * CONFIGURATIONS
+        lines_o = array('H', [0]) * CONFIGURATIONS
+        for x in range(512):
+            free = FULL & ~x
+            o = free
+            while True:
+                index = TERNARY[x] + 2 * TERNARY[o]
+                lines_x[index] = _count_lines(x, o)
+                lines_o[index] = _count_lines(o, x)
+                if o == 0:
+                    break
+                o = (o - 1) & free
+        _open_lines = (lines_x, lines_o)
+    return _open_lines
+
+
+class Evaluator:
+    """A two-sided evaluation with tunable weights.
+
+    Each 3x3 board is scored as the weighted open lines of 'X' minus those
+    of 'O', so the opponent's threats count as much as the player's own.
+    The InnerBoard scores are multiplied by the weight of their place on
+    the condition board, which is scored the same way and multiplied by
+    the condition weight. Each weighted score is looked up in a table per
+    board weight, built once per Evaluator, and read through the
+    configuration indices the GameState maintains incrementally.
+
+    With DEFAULT_WEIGHTS the score equals the difference of the players'
+    GameState.heuristic.
+
+    Attributes:
+        weights: The Weights of the evaluation.
+        tables: The table of weighted 'X' minus 'O' line scores of each
+          InnerBoard, indexed by configuration.
+        condition: The same table for the condition board.
+    """
+
+    def __init__(self, weights=DEFAULT_WEIGHTS):
+        """Builds the tables of the given Weights."""
+        self.weights = weights = Weights(*weights)
+        lines_x, lines_o = open_lines()
+        scores = {}
+        for code in set(lines_x):
+            scores[code] = (weights.one * (code & 15)
+                            + weights.two * (code >> 4 & 15)
+                            + weights.three * (code >> 8))
+        difference = [scores[x] - scores[o] for x, o in zip(lines_x, lines_o)]
+
+        def scaled(factor):
+            return array('q', [round(factor * score) for score in difference])
+
+        boards = {name: scaled(getattr(weights, name))
+                  for name in set(BOARD_WEIGHTS)}
+        self.tables = tuple(boards[name] for name in BOARD_WEIGHTS)
+        self.condition = scaled(weights.condition)
+        self.freedom = round(weights.freedom)
+
+    def evaluate(self, game):
+        """Scores a position from the perspective of the player to move."""
+        t = self.tables
+        i = game.indices
+        meta = game.meta
+        score = (t[0][i[0]] + t[1][i[1]] + t[2][i[2]] + t[3][i[3]]
+                 + t[4][i[4]] + t[5][i[5]] + t[6][i[6]] + t[7][i[7]]
+                 + t[8][i[8]]
+                 + self.condition[TERNARY[meta[0]] + 2 * TERNARY[meta[1]]])
+        if game.player:
+            score = -score
+        if game.target < 0:
+            score += self.freedom
+        return score
+
+
+def load_weights(path):
+    """Reads Weights saved with save_weights.
+
+    Fields missing from the file keep their DEFAULT_WEIGHTS value.
+
+    Raises:
+        ValueError: The file holds a field that is not a weight.
+    """
+    import json
+    with open(path) as f:
+        stored = json.load(f)
+    unknown = set(stored) - set(Weights._fields)
+    if unknown:
+        raise ValueError('{} holds unknown weights {}'.format(
+            path, sorted(unknown)))
+    return DEFAULT_WEIGHTS._replace(**stored)
+
+
+def save_weights(path, weights):
+    """Writes Weights to a JSON file."""
+    import json
+    with open(path, 'w') as f:
+        json.dump({name: round(value, 6) for name, value
+                   in Weights(*weights)._asdict().items()}, f, indent=2)
+        f.write('\n')
@@ -0,0 +1,372 @@
+import argparse
+import collections
+import struct
+import sys
+from GameState import *
+
+# A packed position is one integer of POSITION_BITS bits, stored little
+# endian in POSITION_SIZE bytes. Cell inner * 9 + space takes 2 bits from
+# bit 2 * (inner * 9 + space), 0 when empty, 1 for 'X' and 2 for 'O'. The
+# status code of every InnerBoard follows in 2 bits each from META_SHIFT,
+# then the player to move in 1 bit and the target InnerBoard plus one in
+# 4 bits.
+META_SHIFT = 162
+PLAYER_SHIFT = 180
+TARGET_SHIFT = 181
+POSITION_BITS = 185
+POSITION_SIZE = (POSITION_BITS + 7) // 8
+
+# SPREAD[mask] moves bit i of a 9-bit mask to bit 2i, and UNSPREAD undoes it
+SPREAD = tuple(sum(1 << 2 * i for i in BITS[mask]) for mask in range(512))
+UNSPREAD = {spread: mask for mask, spread in enumerate(SPREAD)}
+EVEN_BITS = SPREAD[FULL]
+CELL_MASK = (1 << 2 * 81) - 1
+
+# Files of packed positions and of game records start with a header of the
+# magic bytes and the format version
+POSITIONS_MAGIC = b'UTTTPOS\0'
+RECORDS_MAGIC = b'UTTTGAME'
+FORMAT_VERSION = 1
+FILE_HEADER = struct.Struct('<8sI')
+
+# Every game record starts with the first player, the result as a status
+# code and the number of moves, followed by the moves, one byte each
+RECORD_HEADER = struct.Struct('<BBH')
+
+GameRecord = collections.namedtuple('GameRecord',
+                                    ['first', 'result', 'moves'])
+GameRecord.__doc__ = """One game read from a game record file.
+
+Attributes:
+    first: Index into MARKERS of the player who moved first.
+    result: The status code of the game, UNDECIDED if it was unfinished,
+      X_WON, O_WON or TIED.
+    moves: The encoded moves as bytes, one move per byte.
+"""
+
+
+def board_status(game, inner):
+    """Returns the status code of an InnerBoard of a game."""
+    bit = 1 << inner
+    if game.meta[0] & bit:
+        return X_WON
+    if game.meta[1] & bit:
+        return O_WON
+    return TIED if game.decided & bit else UNDECIDED
+
+
+def game_status(game):
+    """Returns the status code of a game, UNDECIDED while in progress."""
+    return STATUS_WINNER.index(game.winner)
+
+
+def pack_position(game):
+    """Packs a position into POSITION_SIZE bytes.
+
+    Args:
+        game: The GameState to pack. Its undo history is not included.
+
+    Return:
+        The packed position as bytes.
+    """
+    x, o = game.cells
+    code = 0
+    for inner in range(8, -1, -1):
+        code = code << 18 | SPREAD[x[inner]] | SPREAD[o[inner]] << 1
+    meta = 0
+    for inner in range(8, -1, -1):
+        meta = meta << 2 | board_status(game, inner)
+    code |= (meta << META_SHIFT | game.player << PLAYER_SHIFT
+             | (game.target + 1) << TARGET_SHIFT)
+    return code.to_bytes(POSITION_SIZE, 'little')
+
+
+def unpack_position(data):
+    """Unpacks a position packed by pack_position.
+
+    Args:
+        data: POSITION_SIZE bytes, or any buffer holding them.
+
+    Return:
+        A new GameState holding the position, with an empty history.
+
+    Raises:
+        ValueError: The data is not a consistent packed position.
+    """
+    code = int.from_bytes(data, 'little')
+    if len(data) != POSITION_SIZE or code >> POSITION_BITS:
+        raise ValueError('A packed position is {} bytes of {} bits'.format(
+            POSITION_SIZE, POSITION_BITS))
+    cells = code & CELL_MASK
+    x = o = 0
+    for inner in range(9):
+        chunk = cells >> 18 * inner & 0x3FFFF
+        x_mask = UNSPREAD[chunk & EVEN_BITS]
+        o_mask = UNSPREAD[chunk >> 1 & EVEN_BITS]
+        if x_mask & o_mask:
+            raise ValueError('InnerBoard #{} has a space holding both '
+                             'markers'.format(inner))
+        x |= x_mask << 9 * inner
+        o |= o_mask << 9 * inner
+    target = (code >> TARGET_SHIFT) - 1
+    if not -1 <= target < 9:
+        raise ValueError('Invalid target InnerBoard {}'.format(target))
+    game = GameState.decode((x, o, code >> PLAYER_SHIFT & 1, target))
+
+    meta = code >> META_SHIFT
+    for inner in range(9):
+        if meta >> 2 * inner & 3 != board_status(game, inner):
+            raise ValueError('The status of InnerBoard #{} does not match '
+                             'its markers'.format(inner))
+    return game
+
+
+def to_notation(game):
+    """Writes a position in text notation.
+
+    The notation lists the nine InnerBoards separated by '/', each as its
+    nine spaces of 'X', 'O' or a digit counting consecutive empty spaces,
+    followed by the marker to move and the target InnerBoard ('-' for any).
+    The empty board with 'X' to move is '9/9/9/9/9/9/9/9/9 X -'.
+
+    Return:
+        The position's notation string.
+    """
+    boards = []
+    for inner in range(9):
+        text, empty = '', 0
+        for space in range(9):
+            marker = game.marker_at(inner, space)
+            if marker == EMPTY:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += marker
+        boards.append(text + str(empty) if empty else text)
+    target = '-' if game.target < 0 else str(game.target)
+    return '{} {} {}'.format('/'.join(boards), MARKERS[game.player], target)
+
+
+def from_notation(text):
+    """Reads a position written with to_notation.
+
+    Return:
+        A new GameState holding the position, with an empty history.
+
+    Raises:
+        ValueError: The text is not a valid position.
+    """
+    try:
+        boards, marker, target = text.split()
+        boards = boards.split('/')
+        player = MARKERS.index(marker)
+        target = -1 if target == '-' else int(target)
+    except ValueError:
+        raise ValueError('Expected "<boards> <X|O> <target|->", got {!r}'
+                         .format(text))
+    if len(boards) != 9 or not -1 <= target < 9:
+        raise ValueError('Expected nine InnerBoards and a target from 0 to '
+                         '8, got {!r}'.format(text))
+
+    x = o = 0
+    for inner, board in enumerate(boards):
+        space = 0
+        for char in board:
+            if char.isdigit():
+                space += int(char)
+                continue
+            if char not in MARKERS or space >= 9:
+                raise ValueError('Invalid InnerBoard #{}: {!r}'.format(
+                    inner, board))
+            if char == MARKERS[0]:
+                x |= 1 << 9 * inner + space
+            else:
+                o |= 1 << 9 * inner + space
+            space += 1
+        if space != 9:
+            raise ValueError('InnerBoard #{} has {} spaces, not 9: {!r}'
+                             .format(inner, space, board))
+    return GameState.decode((x, o, player, target))
+
+
+def _read_header(file, magic):
+    """Reads and checks a file header.
+
+    Raises:
+        ValueError: The file does not start with the magic bytes of this
+          FORMAT_VERSION.
+    """
+    header = file.read(FILE_HEADER.size)
+    if (len(header) != FILE_HEADER.size
+            or FILE_HEADER.unpack(header) != (magic, FORMAT_VERSION)):
+        raise ValueError('{} is not a version {} {} file'.format(
+            file.name, FORMAT_VERSION, magic.rstrip(b'\0').decode()))
+
+
+def write_positions(path, games):
+    """Writes packed positions to a file.
+
+    Args:
+        path: The file to write.
+        games: An iterable of GameState objects, consumed lazily.
+
+    Return:
+        The number of positions written.
+    """
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(FILE_HEADER.pack(POSITIONS_MAGIC, FORMAT_VERSION))
+        for game in games:
+            f.write(pack_position(game))
+            count += 1
+    return count
+
+
+def read_positions(path, chunk=4096):
+    """Streams the packed positions of a file written by write_positions.
+
+    Positions are read chunk positions at a time and yielded as bytes, to
+    be unpacked with unpack_position only when needed.
+
+    Raises:
+        ValueError: The file is not a positions file or is truncated.
+    """
+    with open(path, 'rb') as f:
+        _read_header(f, POSITIONS_MAGIC)
+        while True:
+            data = f.read(chunk * POSITION_SIZE)
+            if not data:
+                return
+            if len(data) % POSITION_SIZE:
+                raise ValueError('{} ends with a partial position'.format(
+                    path))
+            for offset in range(0, len(data), POSITION_SIZE):
+                yield data[offset:offset + POSITION_SIZE]
+
+
+class GameRecordWriter:
+    """Streams game records to a binary file.
+
+    Each game costs RECORD_HEADER.size bytes plus one byte per move.
+    """
+
+    def __init__(self, path):
+        """Opens the file for writing and writes its header."""
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(RECORDS_MAGIC, FORMAT_VERSION))
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, moves, result, first=0):
+        """Writes one game.
+
+        Args:
+            moves: The encoded moves, as bytes or a sequence of integers.
+            result: The game's status code, or its winner as returned by
+              GameState.winner.
+            first: Index into MARKERS of the player who moved first.
+        """
+        if not isinstance(result, int):
+            result = STATUS_WINNER.index(result)
+        self.file.write(RECORD_HEADER.pack(first, result, len(moves)))
+        self.file.write(bytes(moves))
+        self.count += 1
+
+    def write_game(self, game):
+        """Writes the moves played in a GameState from an empty board."""
+        moves = bytes(entry[1] * 9 + entry[2] for entry in game.history)
+        first = game.history[0][0] if game.history else game.player
+        self.write(moves, game_status(game), first)
+
+    def close(self):
+        """Closes the file."""
+        self.file.close()
+
+
+def read_records(path):
+    """Streams the games of a file written by a GameRecordWriter.
+
+    Only the header and the move bytes of each game are read; no object
+    is created per move.
+
+    Yields:
+        A GameRecord per game.
+
+    Raises:
+        ValueError: The file is not a game record file or is truncated.
+    """
+    with open(path, 'rb') as f:
+        _read_header(f, RECORDS_MAGIC)
+        read = f.read
+        size = RECORD_HEADER.size
+        while True:
+            header = read(size)
+            if not header:
+                return
+            if len(header) != size:
+                raise ValueError('{} ends with a partial record'.format(path))
+            first, result, length = RECORD_HEADER.unpack(header)
+            moves = read(length)
+            if len(moves) != length:
+                raise ValueError('{} ends with a partial record'.format(path))
+            yield GameRecord(first, result, moves)
+
+
+def replay(record):
+    """Replays a game record move by move.
+
+    The same GameState is yielded after each move, so copy or pack it if
+    it must outlive the next step.
+
+    Yields:
+        The GameState after each move.
+    """
+    game = GameState(record.first)
+    for move in record.moves:
+        game.make_move(move)
+        yield game
+
+
+def main(argv=None):
+    """Summarizes a game record file or converts between notations."""
+    parser = argparse.ArgumentParser(
+        description='Inspect Ultimate Tic-Tac-Toe positions and records.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    summary = commands.add_parser('summary', help='tally a game record file')
+    summary.add_argument('path')
+    show = commands.add_parser('show', help='print the positions of a file '
+                               'of packed positions in text notation')
+    show.add_argument('path')
+    pack = commands.add_parser('pack', help='print the packed hex of a '
+                               'position given in text notation')
+    pack.add_argument('notation')
+    args = parser.parse_args(argv)
+
+    if args.command == 'summary':
+        results = [0] * 4
+        moves = 0
+        for record in read_records(args.path):
+            results[record.result] += 1
+            moves += len(record.moves)
+        games = sum(results)
+        print('{} games, {} moves, {:.1f} moves per game'.format(
+            games, moves, moves / games if games else 0.0))
+        print('X {}, O {}, ties {}, unfinished {}'.format(
+            results[X_WON], results[O_WON], results[TIED],
+            results[UNDECIDED]))
+    elif args.command == 'show':
+        for data in read_positions(args.path):
+            print(to_notation(unpack_position(data)))
+    else:
+        print(pack_position(from_notation(args.notation)).hex())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,504 @@
+import argparse
+import asyncio
+import collections
+import json
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from GameState import GameState, MARKERS
+from Arena import ENGINES, cached_engine
+from GameRecord import to_notation
+
+# The engines sessions may play against and their options. Options are
+# fixed by the server so that a client cannot request an unbounded search.
+DEFAULT_ENGINES = {
+    'random': {},
+    'greedy': {},
+    'alphabeta': {'time_limit': 0.5},
+    'mcts': {'time_limit': 0.5},
+}
+
+
+def _reply(code, name, options):
+    """Chooses the AI's reply to a position in a worker process.
+
+    Engines are created once per worker and reused across sessions.
+
+    Return:
+        The encoded move chosen by the engine.
+    """
+    return cached_engine(name, options).choose_move(GameState.decode(code))
+
+
+def parse_move(move):
+    """Reads a client's move.
+
+    Return:
+        A tuple of the InnerBoard and the space.
+
+    Raises:
+        RequestError: The move is not a list of two integers.
+    """
+    if (not isinstance(move, list) or len(move) != 2
+            or not all(isinstance(value, int)
+                       and not isinstance(value, bool) for value in move)):
+        raise RequestError('Moves are two integers, not {}.'.format(
+            json.dumps(move)))
+    return move[0], move[1]
+
+
+def validate_move(game, inner, space):
+    """Checks a move against the rules used by TictacPlayer.prompt_input.
+
+    Args:
+        game: The position the move is made in.
+        inner: The InnerBoard of the move.
+        space: The space within the InnerBoard.
+
+    Return:
+        None if the move is legal, otherwise a message explaining why not.
+    """
+    if game.winner is not None:
+        return 'The game is over.'
+    if not (0 <= inner < 9 and 0 <= space < 9):
+        return 'Moves are two integers from 0 to 8, not {}.'.format(
+            [inner, space])
+    if game.target >= 0 and inner != game.target:
+        return 'That is not the correct inner board! Try {}.'.format(
+            game.target)
+    if not game.is_legal(inner, space):
+        marker = game.marker_at(inner, space)
+        if marker in MARKERS:
+            return 'That space is already occupied with {}!'.format(marker)
+        return 'InnerBoard #{} has already been decided.'.format(inner)
+    return None
+
+
+def describe(game):
+    """Returns a JSON serializable description of a position.
+
+    Return:
+        A dictionary of the board as an 81 character string of 'X', 'O'
+        and '_' (InnerBoard by InnerBoard), the marker to move, the target
+        InnerBoard (-1 for any), the winner and the position in the text
+        notation of GameRecord.to_notation.
+    """
+    return {
+        'board': ''.join(game.marker_at(inner, space)
+                         for inner in range(9) for space in range(9)),
+        'to_move': MARKERS[game.player],
+        'target': game.target,
+        'winner': game.winner,
+        'position': to_notation(game),
+    }
+
+
+class Session:
+    """The compact state of one game hosted by the GameServer.
+
+    Only the GameState encoding is kept between requests, so an idle
+    session costs a few small integers rather than a board of objects.
+
+    Attributes:
+        code: The position as returned by GameState.encode.
+        ai: Index into MARKERS of the AI's marker, None if both players
+          are clients.
+        engine: The name of the engine making the AI's moves.
+        plies: The number of moves played.
+        last_active: The time.monotonic() of the last request.
+        busy: True while the AI's reply is being computed.
+    """
+    __slots__ = ('code', 'ai', 'engine', 'plies', 'last_active', 'busy')
+
+    def __init__(self, code, ai, engine):
+        self.code = code
+        self.ai = ai
+        self.engine = engine
+        self.plies = 0
+        self.last_active = time.monotonic()
+        self.busy = False
+
+
+class RequestError(Exception):
+    """A request that the GameServer rejects with an error response."""
+
+
+class GameServer:
+    """Hosts many independent games over a JSON lines protocol on asyncio.
+
+    Each line a client sends is a JSON object with an 'op' and its
+    arguments, and each is answered with one JSON line carrying 'ok' and
+    either the result or an 'error'. A 'seq' value in a request is echoed
+    in its response, as requests on one connection are handled
+    concurrently and may be answered out of order. The operations are:
+
+      new: Starts a session; 'engine' names the AI and 'ai' is its marker,
+        'X' to move first, 'O' (the default) or null for no AI.
+      move: Plays 'move', a two integer list of the InnerBoard and space,
+        in session 'id', followed by the AI's reply.
+      state: Describes session 'id'.
+      close: Ends session 'id'.
+      stats: Reports the server's counters.
+
+    AI replies are computed in a bounded process pool so that searches
+    never block the event loop, and sessions idle for longer than
+    idle_timeout are evicted.
+
+    Attributes:
+        engines: A dictionary of the engine names sessions may use and the
+          options each is created with.
+        workers: The number of worker processes, None for one per CPU.
+        max_pending: The most AI replies queued or running at once.
+        idle_timeout: Seconds without a request before a session is
+          evicted.
+        max_sessions: The most sessions hosted at once.
+        sessions: The sessions keyed by ID, least recently active first.
+        evicted: The number of sessions evicted for being idle.
+        waiting: The number of AI replies queued or being computed.
+    """
+
+    def __init__(self, engines=None, workers=None, max_pending=None,
+                 idle_timeout=300.0, max_sessions=10000):
+        """Initializes the server; the process pool starts on first use.
+
+        Raises:
+            ValueError: An engine name is not in the Arena's ENGINES.
+        """
+        self.engines = DEFAULT_ENGINES if engines is None else engines
+        for name in self.engines:
+            if name not in ENGINES:
+                raise ValueError('Unknown engine {}, expected one of {}'
+                                 .format(name, sorted(ENGINES)))
+        self.workers = workers
+        self.max_pending = max_pending or 4 * (workers or 4)
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions = collections.OrderedDict()
+        self.evicted = 0
+        self.waiting = 0
+        self.executor = None
+        self.pending = None
+        self.server = None
+        self.sweeper = None
+
+    def _pool(self):
+        """Returns the process pool, starting it if necessary."""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        if self.pending is None:
+            self.pending = asyncio.Semaphore(self.max_pending)
+        return self.executor
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """Starts listening for connections and sweeping idle sessions."""
+        self.server = await asyncio.start_server(self._connection, host,
+                                                 port)
+        self.sweeper = asyncio.create_task(self._sweep())
+        return self.server
+
+    async def close(self):
+        """Stops listening and shuts down the worker processes."""
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            self.sweeper = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def _sweep(self):
+        """Evicts idle sessions periodically."""
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            self.evict_idle()
+
+    def evict_idle(self, now=None):
+        """Evicts the sessions idle for longer than idle_timeout.
+
+        Sessions are kept in order of activity, so only the evicted ones
+        and the first active one are visited.
+
+        Return:
+            The number of sessions evicted.
+        """
+        if now is None:
+            now = time.monotonic()
+        count = 0
+        sessions = self.sessions
+        while sessions:
+            key, session = next(iter(sessions.items()))
+            if now - session.last_active <= self.idle_timeout:
+                break
+            del sessions[key]
+            count += 1
+        self.evicted += count
+        return count
+
+    def _session(self, key):
+        """Returns a session and marks it active.
+
+        Raises:
+            RequestError: The ID is not a string or an integer, or there is
+              no session with it.
+        """
+        if not isinstance(key, (str, int)) or isinstance(key, bool):
+            raise RequestError('Session IDs are strings or integers, not '
+                               '{}.'.format(json.dumps(key)))
+        session = self.sessions.get(key)
+        if session is None:
+            raise RequestError('Unknown session {}.'.format(key))
+        session.last_active = time.monotonic()
+        self.sessions.move_to_end(key)
+        return session
+
+    async def _ai_move(self, session, game):
+        """Computes and plays the AI's reply in the process pool.
+
+        Only game is changed; the caller stores it in the session once the
+        reply has been played.
+
+        Return:
+            The AI's move as a two integer list.
+
+        Raises:
+            RequestError: The worker failed to compute the reply. A broken
+              pool is replaced on the next request.
+        """
+        executor = self._pool()
+        self.waiting += 1
+        try:
+            async with self.pending:
+                move = await asyncio.get_running_loop().run_in_executor(
+                    executor, _reply, game.encode(), session.engine,
+                    self.engines[session.engine])
+        except BrokenProcessPool:
+            if self.executor is executor:
+                self.executor = None
+                executor.shutdown(wait=False)
+            raise RequestError('The AI could not reply, try again.')
+        except Exception as e:
+            raise RequestError('The AI could not reply: {}.'.format(e))
+        finally:
+            self.waiting -= 1
+        game.make_move(move)
+        return [move // 9, move % 9]
+
+    async def new(self, engine='greedy', ai='O'):
+        """Starts a session, playing the AI's first move if it is 'X'.
+
+        Return:
+            A dictionary of the session ID, the AI's move (or None) and
+            the position, see describe.
+
+        Raises:
+            RequestError: The engine or marker is unknown, or the server
+              is full.
+        """
+        if not isinstance(engine, str) or engine not in self.engines:
+            raise RequestError('Unknown engine {}, expected one of {}.'
+                               .format(json.dumps(engine),
+                                       sorted(self.engines)))
+        if ai is not None and (not isinstance(ai, str) or ai not in MARKERS):
+            raise RequestError('The AI plays {} or {}, not {}.'.format(
+                *MARKERS, ai))
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle()
+            if len(self.sessions) >= self.max_sessions:
+                raise RequestError('The server is full.')
+
+        key = secrets.token_hex(8)
+        game = GameState()
+        session = Session(game.encode(), None if ai is None
+                          else MARKERS.index(ai), engine)
+        self.sessions[key] = session
+        reply = None
+        if session.ai == game.player:
+            session.busy = True
+            try:
+                reply = await self._ai_move(session, game)
+            except RequestError:
+                self.sessions.pop(key, None)
+                raise
+            finally:
+                session.busy = False
+            session.plies += 1
+            session.code = game.encode()
+        return dict(id=key, reply=reply, **describe(game))
+
+    async def move(self, key, move):
+        """Plays a client's move and the AI's reply in a session.
+
+        The session keeps its position until the AI has replied, so if the
+        reply fails the client's move is not applied and may be sent again.
+
+        Return:
+            A dictionary of the AI's reply (or None) and the position.
+
+        Raises:
+            RequestError: The session is unknown or busy, it is the AI's
+              turn, the move is illegal, or the AI could not reply.
+        """
+        session = self._session(key)
+        if session.busy:
+            raise RequestError('Session {} is waiting for the AI.'.format(
+                key))
+        game = GameState.decode(session.code)
+        if game.player == session.ai:
+            raise RequestError('It is not your turn.')
+        inner, space = parse_move(move)
+        error = validate_move(game, inner, space)
+        if error is not None:
+            raise RequestError(error)
+
+        game.make_move(inner * 9 + space)
+        plies = 1
+        reply = None
+        if game.winner is None and session.ai is not None:
+            session.busy = True
+            try:
+                reply = await self._ai_move(session, game)
+            finally:
+                session.busy = False
+            plies += 1
+        session.plies += plies
+        session.code = game.encode()
+        return dict(reply=reply, **describe(game))
+
+    def state(self, key):
+        """Describes a session's position and progress."""
+        session = self._session(key)
+        game = GameState.decode(session.code)
+        ai = None if session.ai is None else MARKERS[session.ai]
+        return dict(engine=session.engine, ai=ai, plies=session.plies,
+                    **describe(game))
+
+    def end(self, key):
+        """Ends a session."""
+        self._session(key)
+        del self.sessions[key]
+        return {}
+
+    def stats(self):
+        """Returns the server's session and executor counters."""
+        return {'sessions': len(self.sessions), 'evicted': self.evicted,
+                'waiting': self.waiting, 'max_pending': self.max_pending}
+
+    async def handle(self, request):
+        """Answers one decoded request, see the class description.
+
+        Return:
+            The JSON serializable response.
+        """
+        response = {}
+        if isinstance(request, dict) and 'seq' in request:
+            response['seq'] = request['seq']
+        try:
+            if not isinstance(request, dict):
+                raise RequestError('Requests are JSON objects.')
+            op = request.get('op')
+            if op == 'new':
+                result = await self.new(request.get('engine', 'greedy'),
+                                        request.get('ai', 'O'))
+            elif op == 'move':
+                result = await self.move(request.get('id'),
+                                         request.get('move'))
+            elif op == 'state':
+                result = self.state(request.get('id'))
+            elif op == 'close':
+                result = self.end(request.get('id'))
+            elif op == 'stats':
+                result = self.stats()
+            else:
+                raise RequestError('Unknown op {}.'.format(op))
+        except RequestError as e:
+            response.update(ok=False, error=str(e))
+            return response
+        except Exception as e:
+            # Every request is answered, even one that hits a bug
+            response.update(ok=False, error='Internal error: {}: {}'.format(
+                type(e).__name__, e))
+            return response
+        response.update(ok=True, **result)
+        return response
+
+    async def _connection(self, reader, writer):
+        """Serves the requests of one client connection."""
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def answer(line):
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {'ok': False, 'error': 'Invalid JSON.'}
+            else:
+                response = await self.handle(request)
+            async with lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port, **options):
+    """Runs a GameServer until cancelled."""
+    server = GameServer(**options)
+    listener = await server.start(host, port)
+    print('Serving on {}'.format(', '.join(
+        str(sock.getsockname()) for sock in listener.sockets)))
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    """Runs the game server from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Host Ultimate Tic-Tac-Toe games over JSON lines.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker processes, default one per CPU')
+    parser.add_argument('--max-pending', type=int, default=None)
+    parser.add_argument('--idle-timeout', type=float, default=300.0)
+    parser.add_argument('--max-sessions', type=int, default=10000)
+    parser.add_argument('--time-limit', type=float, default=0.5,
+                        help='seconds per move for searching engines')
+    args = parser.parse_args(argv)
+
+    engines = {name: dict(options) for name, options
+               in DEFAULT_ENGINES.items()}
+    for options in engines.values():
+        if 'time_limit' in options:
+            options['time_limit'] = args.time_limit
+    try:
+        asyncio.run(serve(args.host, args.port, engines=engines,
+                          workers=args.workers,
+                          max_pending=args.max_pending,
+                          idle_timeout=args.idle_timeout,
+                          max_sessions=args.max_sessions))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
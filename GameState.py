@@ -0,0 +1,634 @@
+import os
+import random
+from array import array
+
+MARKERS = ('X', 'O')
+EMPTY = '_'
+TIE = 'T'
+
+# Every 3x3 board (InnerBoard or the condition board) is stored as a 9-bit
+# mask per player, where bit i is set when that player holds space i
+# (spaces are numbered 0-8 in row major order).
+FULL = 0b111111111
+LINES = ((0, 1, 2), (3, 4, 5), (6, 7, 8),
+         (0, 3, 6), (1, 4, 7), (2, 5, 8),
+         (0, 4, 8), (2, 4, 6))
+LINE_MASKS = tuple(sum(1 << i for i in line) for line in LINES)
+
+# Lookup tables indexed by a 9-bit mask
+POPCOUNT = tuple(bin(mask).count('1') for mask in range(512))
+BITS = tuple(tuple(i for i in range(9) if mask >> i & 1)
+             for mask in range(512))
+WINNING = tuple(any(mask & line == line for line in LINE_MASKS)
+                for mask in range(512))
+
+# Score awarded for a line holding one, two or three of a player's markers
+# and none of the opponent's
+LINE_SCORES = (0, 10, 100, 1000)
+
+
+def line_heuristic(mine, theirs):
+    """Scores the open lines of a 3x3 board for one player.
+
+    Args:
+        mine: The 9-bit mask of the player's markers.
+        theirs: The 9-bit mask of the opponent's markers.
+
+    Return:
+        The sum of LINE_SCORES over the lines the opponent has not blocked.
+    """
+    score = 0
+    for line in LINE_MASKS:
+        if not theirs & line:
+            score += LINE_SCORES[POPCOUNT[mine & line]]
+    return score
+
+
+# A 3x3 board has 3^9 configurations, indexed in base 3 with 1 for an 'X'
+# and 2 for an 'O': TERNARY[x_mask] + 2 * TERNARY[o_mask].
+CONFIGURATIONS = 3 ** 9
+TERNARY = tuple(sum(3 ** i for i in BITS[mask]) for mask in range(512))
+
+# Status codes of a 3x3 board configuration, and the matching winner
+UNDECIDED = 0
+X_WON = 1
+O_WON = 2
+TIED = 3
+STATUS_WINNER = (None, MARKERS[0], MARKERS[1], TIE)
+
+TABLE_VERSION = 1
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '__pycache__', 'GameState.tables.bin')
+
+
+def build_tables():
+    """Computes the heuristic and status of every 3x3 configuration.
+
+    Return:
+        A tuple of the per player heuristic arrays (indexed like MARKERS) and
+        the status array, each indexed by the base 3 configuration index.
+    """
+    heuristic_x = array('i', [0]) * CONFIGURATIONS
+    heuristic_o = array('i', [0]) * CONFIGURATIONS
+    status = array('b', [UNDECIDED]) * CONFIGURATIONS
+    for x in range(512):
+        # Walk every subset of the spaces 'X' leaves empty
+        free = FULL & ~x
+        o = free
+        while True:
+            index = TERNARY[x] + 2 * TERNARY[o]
+            heuristic_x[index] = line_heuristic(x, o)
+            heuristic_o[index] = line_heuristic(o, x)
+            if WINNING[x]:
+                status[index] = X_WON
+            elif WINNING[o]:
+                status[index] = O_WON
+            elif x | o == FULL:
+                status[index] = TIED
+            if o == 0:
+                break
+            o = (o - 1) & free
+    return (heuristic_x, heuristic_o), status
+
+
+def load_tables(path=TABLE_PATH):
+    """Loads the configuration tables from disk, building them if needed.
+
+    The tables are cached on disk after being built, tagged with
+    TABLE_VERSION and LINE_SCORES so that a stale cache is rebuilt. Failing
+    to read or write the cache only costs the time to build the tables.
+
+    Args:
+        path: The location of the cache file.
+
+    Return:
+        The tables in the same form as build_tables.
+    """
+    header = array('i', (TABLE_VERSION,) + LINE_SCORES)
+    try:
+        with open(path, 'rb') as f:
+            stored = array('i')
+            stored.fromfile(f, len(header))
+            if stored == header:
+                heuristic_x, heuristic_o = array('i'), array('i')
+                status = array('b')
+                heuristic_x.fromfile(f, CONFIGURATIONS)
+                heuristic_o.fromfile(f, CONFIGURATIONS)
+                status.fromfile(f, CONFIGURATIONS)
+                return (heuristic_x, heuristic_o), status
+    except (OSError, EOFError):
+        pass
+
+    heuristics, status = build_tables()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a private file first so concurrent readers never see a
+        # partially written cache
+        partial = '{}.{}'.format(path, os.getpid())
+        with open(partial, 'wb') as f:
+            header.tofile(f)
+            heuristics[0].tofile(f)
+            heuristics[1].tofile(f)
+            status.tofile(f)
+        os.replace(partial, path)
+    except OSError:
+        pass
+    return heuristics, status
+
+
+# HEURISTICS[player][index] is the line heuristic of a configuration for the
+# player, and STATUS[index] whether it is undecided, won or tied
+HEURISTICS, STATUS = load_tables()
+
+
+def board_index(x_mask, o_mask):
+    """Returns the base 3 configuration index of a 3x3 board."""
+    return TERNARY[x_mask] + 2 * TERNARY[o_mask]
+
+
+def position_result(x_cells, o_cells):
+    """Determines the result of any position from its markers alone.
+
+    This is a pure query: nothing is mutated or printed, so it may be used on
+    candidate positions, cached, or run in parallel.
+
+    Args:
+        x_cells: The nine 'X' masks, one per InnerBoard.
+        o_cells: The nine 'O' masks, one per InnerBoard.
+
+    Return:
+        A tuple of the condition board's 'X' and 'O' masks, the mask of
+        decided InnerBoards, and the winner: None if the game is in progress,
+        otherwise the winning marker or 'T' if the game is a tie.
+    """
+    meta_x = meta_o = decided = 0
+    for inner in range(9):
+        status = STATUS[TERNARY[x_cells[inner]] + 2 * TERNARY[o_cells[inner]]]
+        if status:
+            decided |= 1 << inner
+            if status == X_WON:
+                meta_x |= 1 << inner
+            elif status == O_WON:
+                meta_o |= 1 << inner
+
+    winner = None
+    if WINNING[meta_x]:
+        winner = MARKERS[0]
+    elif WINNING[meta_o]:
+        winner = MARKERS[1]
+    elif decided == FULL:
+        winner = TIE
+    return meta_x, meta_o, decided, winner
+
+
+# Zobrist keys for each player's marker on each of the 81 spaces (indexed by
+# inner * 9 + space), for the target InnerBoard (indexed by target + 1) and
+# for 'O' being the player to move. A fixed seed keeps hashes stable across
+# processes and runs. The condition board is determined by the spaces, so
+# the cell keys already distinguish positions with different conditions.
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_CELLS = tuple(
+    tuple(_zobrist_random.getrandbits(64) for cell in range(81))
+    for player in range(2))
+ZOBRIST_TARGET = tuple(_zobrist_random.getrandbits(64) for target in range(10))
+ZOBRIST_PLAYER = _zobrist_random.getrandbits(64)
+
+
+class GameState:
+    """A compact bitboard representation of an Ultimate Tic-Tac-Toe game.
+
+    Each player's markers in each InnerBoard are held as a 9-bit integer
+    mask, and the condition (meta) board is two more 9-bit masks of the
+    InnerBoards each player has won. Moves are encoded as a single integer,
+    inner * 9 + space, so that the engine can generate, apply and revert
+    moves without allocating any board objects.
+
+    Attributes:
+        cells: Two lists (one per player) of nine 9-bit masks, one per
+          InnerBoard.
+        meta: Two 9-bit masks of the InnerBoards won by each player.
+        decided: 9-bit mask of the InnerBoards that are won or tied.
+        player: Index into MARKERS of the player to move.
+        target: The InnerBoard where the next move must be made, -1 if the
+          player may move in any undecided InnerBoard.
+        winner: None while the game is in progress, otherwise the winning
+          marker, or 'T' if the game is a tie.
+        history: Stack of undo records, one per applied move.
+        hash: The 64-bit Zobrist hash of the position, maintained
+          incrementally as moves are placed and undone.
+        indices: The base 3 configuration index of each InnerBoard.
+        scores: The running sum of the InnerBoard heuristics for each player,
+          updated for the touched InnerBoard only as moves are placed and
+          undone.
+        debug: If True, every heuristic call cross-checks the running scores
+          against a full recomputation.
+    """
+
+    def __init__(self, player=0, debug=False):
+        """Initializes an empty game with the given player to move."""
+        self.cells = [[0] * 9, [0] * 9]
+        self.indices = [0] * 9
+        self.scores = [HEURISTICS[0][0] * 9, HEURISTICS[1][0] * 9]
+        self.debug = debug
+        self.meta = [0, 0]
+        self.decided = 0
+        self.player = player
+        self.target = -1
+        self.winner = None
+        self.history = []
+        self.hash = self.compute_hash()
+
+    def copy(self):
+        """Returns an independent copy of this game state."""
+        new = GameState.__new__(GameState)
+        new.cells = [self.cells[0][:], self.cells[1][:]]
+        new.indices = self.indices[:]
+        new.scores = self.scores[:]
+        new.debug = self.debug
+        new.meta = self.meta[:]
+        new.decided = self.decided
+        new.player = self.player
+        new.target = self.target
+        new.winner = self.winner
+        new.history = self.history[:]
+        new.hash = self.hash
+        return new
+
+    def encode(self):
+        """Returns a compact, picklable encoding of the position.
+
+        Return:
+            A tuple of the 'X' and 'O' markers as 81-bit integers (InnerBoard
+            i occupying bits 9i to 9i + 8), the player to move and the target
+            InnerBoard. The undo history is not included.
+        """
+        x = o = 0
+        for inner in range(9):
+            x |= self.cells[0][inner] << 9 * inner
+            o |= self.cells[1][inner] << 9 * inner
+        return x, o, self.player, self.target
+
+    @classmethod
+    def decode(cls, code):
+        """Creates a GameState from the result of encode.
+
+        Args:
+            code: A tuple of (x, o, player, target) as returned by encode.
+
+        Return:
+            A new GameState holding the position, with an empty history.
+        """
+        x, o, player, target = code
+        game = cls(player)
+        for inner in range(9):
+            game.cells[0][inner] = x >> 9 * inner & FULL
+            game.cells[1][inner] = o >> 9 * inner & FULL
+            game._rescore(inner)
+        game.target = target
+        game._recompute()
+        return game
+
+    def compute_hash(self):
+        """Computes the Zobrist hash of the position from scratch.
+
+        Return:
+            The 64-bit hash of the markers, the target and the player to move.
+        """
+        key = ZOBRIST_TARGET[self.target + 1]
+        if self.player:
+            key ^= ZOBRIST_PLAYER
+        for player in range(2):
+            keys = ZOBRIST_CELLS[player]
+            for inner in range(9):
+                for space in BITS[self.cells[player][inner]]:
+                    key ^= keys[inner * 9 + space]
+        return key
+
+    def set_turn(self, player, target):
+        """Sets the player to move and the target InnerBoard.
+
+        This is a setup operation used when the turn is dictated from
+        outside the engine; it is not recorded in the undo history. A target
+        InnerBoard that is already decided frees the player to move anywhere.
+
+        Args:
+            player: Index into MARKERS of the player to move.
+            target: The InnerBoard where the player must move, -1 for any.
+        """
+        if target >= 0 and self.decided >> target & 1:
+            target = -1
+        self.player = player
+        self.target = target
+        self.hash = self.compute_hash()
+
+    def marker_at(self, inner, space):
+        """Returns the marker at a space of an InnerBoard, '_' if empty."""
+        bit = 1 << space
+        if self.cells[0][inner] & bit:
+            return MARKERS[0]
+        if self.cells[1][inner] & bit:
+            return MARKERS[1]
+        return EMPTY
+
+    def inner_winner(self, inner):
+        """Returns the winner of an InnerBoard.
+
+        Return:
+            None if the InnerBoard is undecided, otherwise the winning marker
+            or 'T' if the InnerBoard is full without a winning line.
+        """
+        bit = 1 << inner
+        if self.meta[0] & bit:
+            return MARKERS[0]
+        if self.meta[1] & bit:
+            return MARKERS[1]
+        if self.decided & bit:
+            return TIE
+        return None
+
+    def heuristic(self, player):
+        """Calculates the game heuristic value for one player.
+
+        The InnerBoard heuristics are summed and the condition board's
+        heuristic is weighted twice as much, as in TictacPlayer.heuristic.
+        The InnerBoard sum is maintained incrementally in scores, so only the
+        condition board is looked up in HEURISTICS.
+
+        Args:
+            player: Index into MARKERS of the player to score.
+
+        Return:
+            The heuristic value of the position for the player.
+
+        Raises:
+            AssertionError: In debug mode, the running scores disagree with
+              a full recomputation.
+        """
+        if self.debug:
+            self.check_scores()
+        return self.scores[player] + HEURISTICS[player][
+            TERNARY[self.meta[0]] + 2 * TERNARY[self.meta[1]]] * 2
+
+    def full_heuristic(self, player):
+        """Calculates the game heuristic value for one player from scratch.
+
+        This sums a HEURISTICS lookup for every InnerBoard rather than using
+        the running scores, and is used to verify them.
+
+        Args:
+            player: Index into MARKERS of the player to score.
+
+        Return:
+            The heuristic value of the position for the player.
+        """
+        table = HEURISTICS[player]
+        x, o = self.cells
+        score = 0
+        for inner in range(9):
+            score += table[TERNARY[x[inner]] + 2 * TERNARY[o[inner]]]
+        return score + table[TERNARY[self.meta[0]]
+                             + 2 * TERNARY[self.meta[1]]] * 2
+
+    def check_scores(self):
+        """Verifies the incremental evaluation against full recomputation.
+
+        Raises:
+            AssertionError: The running indices or scores are out of date.
+        """
+        x, o = self.cells
+        for inner in range(9):
+            expected = TERNARY[x[inner]] + 2 * TERNARY[o[inner]]
+            if self.indices[inner] != expected:
+                raise AssertionError(
+                    'InnerBoard #{} has index {}, expected {}'.format(
+                        inner, self.indices[inner], expected))
+        for player in range(2):
+            expected = sum(HEURISTICS[player][index]
+                           for index in self.indices)
+            if self.scores[player] != expected:
+                raise AssertionError(
+                    'Running score of {} is {}, expected {}'.format(
+                        MARKERS[player], self.scores[player], expected))
+
+    def place(self, player, inner, space):
+        """Places the player's marker and updates the InnerBoard and game.
+
+        The move is recorded so that it can be reverted with undo. The next
+        target is the InnerBoard matching the space played, unless that
+        InnerBoard has already been decided.
+
+        Args:
+            player: Index into MARKERS of the player making the move.
+            inner: The InnerBoard to place the marker in.
+            space: The space within the InnerBoard.
+        """
+        meta = self.meta
+        self.history.append((player, inner, space, self.player, self.target,
+                             self.decided, meta[0], meta[1], self.winner,
+                             self.hash))
+
+        mine = self.cells[player][inner] | 1 << space
+        self.cells[player][inner] = mine
+        self._rescore(inner)
+        bit = 1 << inner
+        if not self.decided & bit:
+            if WINNING[mine]:
+                self.decided |= bit
+                meta[player] |= bit
+                if WINNING[meta[player]]:
+                    self.winner = MARKERS[player]
+            elif mine | self.cells[1 - player][inner] == FULL:
+                self.decided |= bit
+            if self.winner is None and self.decided == FULL:
+                self.winner = TIE
+
+        key = self.hash ^ ZOBRIST_CELLS[player][inner * 9 + space]
+        key ^= ZOBRIST_TARGET[self.target + 1]
+        if self.player != 1 - player:
+            key ^= ZOBRIST_PLAYER
+        self.player = 1 - player
+        self.target = -1 if self.decided >> space & 1 else space
+        self.hash = key ^ ZOBRIST_TARGET[self.target + 1]
+
+    def make_move(self, move):
+        """Plays an encoded move (inner * 9 + space) for the player to move."""
+        self.place(self.player, move // 9, move % 9)
+
+    def undo(self):
+        """Reverts the most recently applied move."""
+        (player, inner, space, self.player, self.target, self.decided,
+         meta0, meta1, self.winner, self.hash) = self.history.pop()
+        self.meta[0] = meta0
+        self.meta[1] = meta1
+        self.cells[player][inner] &= ~(1 << space)
+        self._rescore(inner)
+
+    def _rescore(self, inner):
+        """Updates the running scores after an InnerBoard has changed.
+
+        Only the changed InnerBoard is looked up, and its previous score is
+        replaced exactly, so placing and undoing a move leave the scores as
+        they were.
+        """
+        old = self.indices[inner]
+        new = TERNARY[self.cells[0][inner]] + 2 * TERNARY[self.cells[1][inner]]
+        self.indices[inner] = new
+        self.scores[0] += HEURISTICS[0][new] - HEURISTICS[0][old]
+        self.scores[1] += HEURISTICS[1][new] - HEURISTICS[1][old]
+
+    def is_terminal(self):
+        """Returns True if the game has been won or tied, without side effects.
+
+        The result is maintained as moves are placed, covering InnerBoard
+        wins, condition board wins and draws once every InnerBoard is decided.
+        """
+        return self.winner is not None
+
+    def empty_cells(self):
+        """Returns the number of empty spaces in undecided InnerBoards."""
+        x, o = self.cells
+        empty = 0
+        for inner in BITS[FULL & ~self.decided]:
+            empty += 9 - POPCOUNT[x[inner] | o[inner]]
+        return empty
+
+    def open_boards(self):
+        """Returns the InnerBoards the player to move may play in.
+
+        Return:
+            A tuple of InnerBoard indices, empty if the game is over.
+        """
+        if self.winner is not None:
+            return ()
+        if self.target >= 0:
+            return (self.target,)
+        return BITS[FULL & ~self.decided]
+
+    def iter_moves(self):
+        """Lazily yields the encoded legal moves for the player to move."""
+        x, o = self.cells
+        for inner in self.open_boards():
+            base = inner * 9
+            for space in BITS[FULL & ~(x[inner] | o[inner])]:
+                yield base + space
+
+    def legal_moves(self):
+        """Returns a list of the encoded legal moves for the player to move."""
+        moves = []
+        x, o = self.cells
+        for inner in self.open_boards():
+            base = inner * 9
+            for space in BITS[FULL & ~(x[inner] | o[inner])]:
+                moves.append(base + space)
+        return moves
+
+    def random_move(self, rand=random.random):
+        """Picks a uniformly random legal move without building a move list.
+
+        Args:
+            rand: A function returning a float in [0, 1).
+
+        Return:
+            An encoded legal move, or -1 if the game is over.
+        """
+        if self.winner is not None:
+            return -1
+        x, o = self.cells
+        target = self.target
+        if target >= 0:
+            spaces = BITS[FULL & ~(x[target] | o[target])]
+            return target * 9 + spaces[int(rand() * len(spaces))]
+
+        pick = int(rand() * self.empty_cells())
+        for inner in BITS[FULL & ~self.decided]:
+            spaces = BITS[FULL & ~(x[inner] | o[inner])]
+            if pick < len(spaces):
+                return inner * 9 + spaces[pick]
+            pick -= len(spaces)
+
+    def random_playout(self, rand=random.random):
+        """Finishes the game with random moves and returns the result.
+
+        The moves are those random_move would pick, but they are played on
+        copies of the cell masks, keeping only what decides the game, so
+        the position, its hash, scores and history are left untouched.
+
+        Args:
+            rand: A function returning a float in [0, 1).
+
+        Return:
+            The marker of the winner, or 'T' if the game ends in a tie.
+        """
+        if self.winner is not None:
+            return self.winner
+        x = self.cells[0][:]
+        o = self.cells[1][:]
+        cells = (x, o)
+        meta = self.meta[:]
+        decided = self.decided
+        player = self.player
+        target = self.target
+        while True:
+            if target >= 0:
+                inner = target
+                spaces = BITS[FULL & ~(x[inner] | o[inner])]
+                space = spaces[int(rand() * len(spaces))]
+            else:
+                undecided = BITS[FULL & ~decided]
+                empty = 0
+                for inner in undecided:
+                    empty += 9 - POPCOUNT[x[inner] | o[inner]]
+                pick = int(rand() * empty)
+                for inner in undecided:
+                    spaces = BITS[FULL & ~(x[inner] | o[inner])]
+                    if pick < len(spaces):
+                        space = spaces[pick]
+                        break
+                    pick -= len(spaces)
+
+            # Legal moves are only made in undecided InnerBoards
+            mine = cells[player][inner] | 1 << space
+            cells[player][inner] = mine
+            bit = 1 << inner
+            if WINNING[mine]:
+                decided |= bit
+                meta[player] |= bit
+                if WINNING[meta[player]]:
+                    return MARKERS[player]
+            elif mine | cells[1 - player][inner] == FULL:
+                decided |= bit
+            if decided == FULL:
+                return TIE
+            player = 1 - player
+            target = -1 if decided >> space & 1 else space
+
+    def is_legal(self, inner, space):
+        """Checks whether a move is legal for the player to move."""
+        if inner not in self.open_boards() or not 0 <= space < 9:
+            return False
+        return not (self.cells[0][inner] | self.cells[1][inner]) >> space & 1
+
+    def set_inner(self, inner, x_mask, o_mask):
+        """Overwrites an InnerBoard and recomputes the derived game status.
+
+        This is a setup operation used by the InnerBoard adapter; it is not
+        recorded in the undo history.
+
+        Args:
+            inner: The InnerBoard to overwrite.
+            x_mask: The 9-bit mask of 'X' markers.
+            o_mask: The 9-bit mask of 'O' markers.
+        """
+        self.cells[0][inner] = x_mask
+        self.cells[1][inner] = o_mask
+        self._rescore(inner)
+        self._recompute()
+
+    def _recompute(self):
+        """Recomputes the condition board and winner from the cell masks."""
+        meta_x, meta_o, self.decided, self.winner = position_result(
+            self.cells[0], self.cells[1])
+        self.meta = [meta_x, meta_o]
+        if self.target >= 0 and self.decided >> self.target & 1:
+            self.target = -1
+        self.hash = self.compute_hash()
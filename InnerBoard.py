@@ -1,5 +1,5 @@
 import random
-import numpy as np
+from GameState import *
 
 
 class InnerBoard():
@@ -8,26 +8,53 @@ class InnerBoard():
     This class implements the InnerBoard object and a few methods for
     functionality, such as for placing markers and terminal state validation.
     The larger game board is comprised of nine InnerBoard objects in a 3x3
-    numPy array.
+    grid. Each InnerBoard is a view over a shared GameState engine,
+    which stores the markers as bitmasks.
 
     Attributes:
+        engine: The GameState that holds this InnerBoard's markers.
         state: The current game state of the InnerBoard.
-        innerID: The index of the InnerBoard within the larger board.
+        innerID: The index of the InnerBoard within the larger board, -1 for
+          the condition board.
         winner: String representation of which player won the InnerBoard,
           'T' if the result is a tie
     """
 
-    def __init__(self, id_index):
+    def __init__(self, id_index, engine=None):
         """Initializes the InnerBoard object.
 
-        Creates the InnerBoard object as a 3x3 numPy array with the specified 
-        ID for the InnerBoard. The default for winner is None as no one has won 
-        an empty InnerBoard.
+        Creates the InnerBoard object as a view of the specified InnerBoard
+        within the engine. If no engine is given, the InnerBoard is backed by
+        a fresh empty GameState. An InnerBoard ID of -1 views the condition
+        board, which is derived from the InnerBoards and is read only.
         """
-        self.state = np.array(['_']*9)
-        self.state = np.reshape(self.state, (3, 3))
+        self.engine = engine if engine is not None else GameState()
         self.innerID = id_index
-        self.winner = None
+
+    def masks(self):
+        """Returns the 'X' and 'O' bitmasks of this InnerBoard."""
+        if self.innerID == -1:
+            return self.engine.meta[0], self.engine.meta[1]
+        return (self.engine.cells[0][self.innerID],
+                self.engine.cells[1][self.innerID])
+
+    @property
+    def state(self):
+        """The InnerBoard as a 3x3 numPy array of 'X', 'O' and '_'."""
+        # numpy is only imported once a state is rendered, so that the
+        # rules can be used without it
+        import numpy as np
+        x, o = self.masks()
+        state = [MARKERS[0] if x >> i & 1 else MARKERS[1] if o >> i & 1
+                 else EMPTY for i in range(9)]
+        return np.reshape(np.array(state), (3, 3))
+
+    @property
+    def winner(self):
+        """The winning marker, 'T' for a tie, or None if undecided."""
+        if self.innerID == -1:
+            return self.engine.winner
+        return STATUS_WINNER[STATUS[board_index(*self.masks())]]
 
     def place_marker(self, marker, x, y):
         """ Updates the InnerBoard object to reflect the new move and returns
@@ -36,8 +63,14 @@ class InnerBoard():
         Args:
             marker: The marker to place
             loc: The location that the given marker must be placed
+
+        Raises:
+            ValueError: The condition board cannot be written directly.
         """
-        self.state[x][y] = marker
+        if self.innerID == -1:
+            raise ValueError('The condition board is derived from the '
+                             'InnerBoards and cannot be written directly')
+        self.engine.place(MARKERS.index(marker), self.innerID, x * 3 + y)
 
     def print_inner(self, verbose=True):
         """ Visualization of the InnerBoard object
@@ -58,8 +91,18 @@ class InnerBoard():
         """Used to set the state for this InnerBoard object.
         
         This function serves to update the InnerBoard's state when necessary.
+
+        Raises:
+            ValueError: The condition board cannot be written directly.
         """
-        self.state = state
+        if self.innerID == -1:
+            raise ValueError('The condition board is derived from the '
+                             'InnerBoards and cannot be written directly')
+        import numpy as np
+        flat = np.ravel(state)
+        x = sum(1 << i for i in range(9) if flat[i] == MARKERS[0])
+        o = sum(1 << i for i in range(9) if flat[i] == MARKERS[1])
+        self.engine.set_inner(self.innerID, x, o)
 
     def inner_heuristic(self, my_mark, op_mark):
         """Calculates the heuristic of the InnerBoard.
@@ -67,77 +110,26 @@ class InnerBoard():
         This function serves to calculate the heuristic on a smaller scale for
         the InnerBoard. This smaller heuristic will be compounded with the
         heuristic of the other InnerBoards to calculate the heuristic of the
-        larger game board.
+        larger game board. The score is looked up in the precomputed
+        HEURISTICS table for this InnerBoard's configuration.
+
+        Args:
+            my_mark: The marker of the player to score.
+            op_mark: The marker of the opponent.
 
         Return:
             The heuristic of this InnerBoard.
         """
-
-        score = 0
-
-        # Vertical condition
-        i = 0
-        # Transpose the board so that it may be handled in a simpler manner
-        vert_flip = np.transpose(self.state)
-        while i < 3:
-            unique, counts = np.unique(vert_flip[i], return_counts=True)
-            count = dict(zip(unique, counts))
-            if my_mark in count and op_mark not in count:
-                if count[my_mark] == 1:
-                    score += 10
-                elif count[my_mark] == 2:
-                    score += 100
-                elif count[my_mark] == 3:
-                    score += 1000
-            i += 1
-
-        # Horizontal condition
-        i = 0
-        while i < 3:
-            unique, counts = np.unique(self.state[i], return_counts=True)
-            count = dict(zip(unique, counts))
-            if my_mark in count and op_mark not in count:
-                if count[my_mark] == 1:
-                    score += 10
-                elif count[my_mark] == 2:
-                    score += 100
-                elif count[my_mark] == 3:
-                    score += 1000
-            i += 1
-
-        # Diagonal (TL to BR) condition
-        tlbr = [self.state[0][0], self.state[1][1], self.state[2][2]]
-        unique, counts = np.unique(tlbr, return_counts=True)
-        count = dict(zip(unique, counts))
-        if my_mark in count and op_mark not in count:
-            if count[my_mark] == 1:
-                score += 10
-            elif count[my_mark] == 2:
-                score += 100
-            elif count[my_mark] == 3:
-                score += 1000
-
-        # Diagonal (TR to BL) condition
-        trbl = [self.state[0][2], self.state[1][1], self.state[2][0]]
-        unique, counts = np.unique(trbl, return_counts=True)
-        count = dict(zip(unique, counts))
-        if my_mark in count and op_mark not in count:
-            if count[my_mark] == 1:
-                score += 10
-            elif count[my_mark] == 2:
-                score += 100
-            elif count[my_mark] == 3:
-                score += 1000
-        
-        return score
+        return HEURISTICS[MARKERS.index(my_mark)][board_index(*self.masks())]
 
     def validate(self):
         """ Assesses the current state to see if it is terminal.
 
-        This function assures determines whether the current configuration of 
-        the InnerBoard state is terminal or not. If it is terminal, then the
-        'conditions' attribute of the TictacPlayer class will be updated in the 
-        corresponding square.
+        This function determines whether the current configuration of the
+        InnerBoard state is terminal or not. The status of the InnerBoard's
+        configuration is looked up in the precomputed STATUS table, while the
+        condition board's result is maintained by the GameState engine, so
+        this is a constant time lookup.
 
         Return:
             True if the current InnerBoard configuration is a terminal state. 
@@ -145,40 +137,6 @@ class InnerBoard():
             Three horizontal lines, three vertical lines and two diagonal 
             conditions exist. Additionally, if the InnerBoard is full (meaning 
             all 9 spaces are occupied by a marker) and there is no winning 
-            line, then the winner attribute is set to 'T' for tie.
+            line, then the winner attribute is 'T' for tie.
         """
-        # Vertical condition
-        i = 0
-        while i < 3:
-            if self.state[0][i] == self.state[1][i] == self.state[2][i] and str(self.state[0][i]) != '_':
-                self.winner = self.state[0][i]
-                return True
-            i += 1
-
-        # Horizontal condition
-        i = 0
-        while i < 3:
-            if self.state[i][0] == self.state[i][1] == self.state[i][2] and str(self.state[i][0]) != '_':
-                self.winner = self.state[i][0]
-                return True
-            i += 1
-
-        # Diagonal (TL to BR) condition
-        if self.state[0][0] == self.state[1][1] == self.state[2][2] and str(self.state[0][0]) != '_':
-            self.winner = self.state[0][0]
-            return True
-
-        # Diagonal (TR to BL) condition
-        if self.state[0][2] == self.state[1][1] == self.state[2][0] and str(self.state[0][2]) != '_':
-            self.winner = self.state[0][2]
-            return True
-
-        for row in self.state:
-            if '_' in row:
-                return False
-
-        # If validation reaches this point, then there must be a tie in this
-        # InnerBoard. We will return True for terminal state, but set the
-        # winner attribute to 'T' for tie
-        self.winner = 'T'
-        return True
\ No newline at end of file
+        return self.winner is not None
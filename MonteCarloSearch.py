@@ -0,0 +1,190 @@
+import math
+import random
+import time
+from GameState import *
+
+# The UCT exploration constant, sqrt(2) for rewards in [0, 1]
+EXPLORATION = math.sqrt(2)
+
+
+class Node:
+    """A node of the Monte Carlo search tree.
+
+    Attributes:
+        move: The encoded move that led to this node, -1 for the root.
+        parent: The parent Node, None for the root.
+        children: The expanded child Nodes.
+        untried: The legal moves that have not been expanded yet.
+        visits: The number of playouts through this node.
+        wins: The total reward of those playouts for the player who made
+          move, 1 for a win and 0.5 for a tie.
+        hash: The Zobrist hash of the position at this node.
+    """
+    __slots__ = ('move', 'parent', 'children', 'untried', 'visits', 'wins',
+                 'hash')
+
+    def __init__(self, game, move=-1, parent=None):
+        """Creates a node for the position currently held by game."""
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = game.legal_moves()
+        self.visits = 0
+        self.wins = 0.0
+        self.hash = game.hash
+
+
+class MonteCarloSearch:
+    """A Monte Carlo Tree Search (UCT) player.
+
+    Each iteration descends the tree choosing children by their UCT score,
+    expands one untried move, and finishes the game with uniformly random
+    moves. Playouts run through GameState.random_playout, which plays on
+    copies of the cell masks and skips the hash, score and undo history
+    upkeep of make_move, so the position is never changed. The tree is
+    kept between searches: if the new position is the root, a child or a
+    grandchild of the previous root (the move played and the reply), that
+    subtree becomes the new root.
+
+    Attributes:
+        playout_limit: Playouts per move, None for no limit.
+        time_limit: Wall clock budget per move in seconds, None for no limit.
+        exploration: The UCT exploration constant.
+        root: The root Node of the kept tree, None before the first search.
+        playouts: The number of playouts run by the most recent search.
+        reused: The number of playouts inherited from the kept subtree.
+        elapsed: The wall clock seconds spent by the most recent search.
+        playouts_per_second: The playout throughput of the most recent
+          search.
+        interrupt: A threading.Event that ends the search as if the budget
+          had run out once it is set, or None.
+    """
+
+    def __init__(self, playout_limit=10000, time_limit=1.0,
+                 exploration=EXPLORATION, seed=None):
+        """Initializes the search with the given budget.
+
+        Raises:
+            ValueError: Neither a playout nor a time limit is given.
+        """
+        if playout_limit is None and time_limit is None:
+            raise ValueError('MonteCarloSearch needs a playout or time limit')
+        self.playout_limit = playout_limit
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rand = random.Random(seed).random
+        self.root = None
+        self.playouts = 0
+        self.reused = 0
+        self.elapsed = 0.0
+        self.playouts_per_second = 0.0
+        self.interrupt = None
+
+    def _find_root(self, game):
+        """Returns the kept node for the game's position, or a new root."""
+        old = self.root
+        if old is not None:
+            if old.hash == game.hash:
+                return old
+            for child in old.children:
+                if child.hash == game.hash:
+                    child.parent = None
+                    return child
+                for grandchild in child.children:
+                    if grandchild.hash == game.hash:
+                        grandchild.parent = None
+                        return grandchild
+        return Node(game)
+
+    def search(self, game):
+        """Finds the most visited move for the player to move.
+
+        Args:
+            game: The position to search. It is restored before returning.
+
+        Return:
+            The best encoded move found, or None if there are no legal moves.
+        """
+        start = time.perf_counter()
+        deadline = None
+        if self.time_limit is not None:
+            deadline = start + self.time_limit
+        limit = self.playout_limit
+        if limit is None:
+            limit = float('inf')
+
+        root = self.root = self._find_root(game)
+        self.reused = root.visits
+        if not root.untried and not root.children:
+            return None
+
+        log = math.log
+        sqrt = math.sqrt
+        c = self.exploration
+        rand = self.rand
+        interrupt = self.interrupt
+        playouts = 0
+        while playouts < limit:
+            if playouts & 63 == 63 and (
+                    deadline is not None and time.perf_counter() >= deadline
+                    or interrupt is not None and interrupt.is_set()):
+                break
+
+            # Selection: descend through fully expanded nodes by UCT
+            node = root
+            while not node.untried and node.children:
+                scale = c * sqrt(log(node.visits))
+                best = -1.0
+                for child in node.children:
+                    value = (child.wins / child.visits
+                             + scale / sqrt(child.visits))
+                    if value > best:
+                        best = value
+                        chosen = child
+                node = chosen
+                game.make_move(node.move)
+
+            # Expansion: add one untried move
+            if node.untried:
+                untried = node.untried
+                index = int(rand() * len(untried))
+                move = untried[index]
+                untried[index] = untried[-1]
+                untried.pop()
+                game.make_move(move)
+                child = Node(game, move, node)
+                node.children.append(child)
+                node = child
+
+            # Playout: finish the game with random moves
+            winner = game.random_playout(rand)
+
+            # Backpropagation: reward each node for the player who moved
+            # into it, then restore the root position
+            while node is not root:
+                mover = MARKERS[1 - game.player]
+                node.visits += 1
+                if winner == mover:
+                    node.wins += 1.0
+                elif winner == TIE:
+                    node.wins += 0.5
+                game.undo()
+                node = node.parent
+            root.visits += 1
+            playouts += 1
+
+        self.playouts = playouts
+        self.elapsed = time.perf_counter() - start
+        self.playouts_per_second = 0.0
+        if self.elapsed > 0:
+            self.playouts_per_second = playouts / self.elapsed
+        return max(root.children, key=lambda child: child.visits).move
+
+    def stats(self):
+        """Returns the throughput of the most recent search as a dictionary."""
+        return {
+            'playouts': self.playouts,
+            'reused': self.reused,
+            'elapsed': self.elapsed,
+            'playouts_per_second': self.playouts_per_second,
+        }
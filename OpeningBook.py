@@ -0,0 +1,225 @@
+import argparse
+import mmap
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from GameState import GameState
+from Search import AlphaBetaSearch
+from Symmetry import *
+
+# The file starts with a header of the magic bytes, the format version and
+# the number of entries, followed by the entries sorted by position key.
+# Each entry holds the canonical key of a position (see Symmetry.canonical),
+# the score and the best move for the player to move in the canonical image
+# of the position, and the depth the position was searched to.
+MAGIC = b'UTTTBOOK'
+VERSION = 2
+HEADER = struct.Struct('<8sII')
+ENTRY = struct.Struct('<QiBBxx')
+KEY = struct.Struct('<Q')
+
+
+def _search_position(code, depth):
+    """Searches one book position in a worker process.
+
+    Return:
+        A tuple of the position hash, best move, score and depth. The
+        position is a canonical image, so its hash is its canonical key.
+    """
+    game = GameState.decode(code)
+    search = AlphaBetaSearch(depth, time_limit=None)
+    move = search.search(game)
+    return game.hash, move, search.score, search.depth
+
+
+def build_book(path, plies=2, depth=6, workers=None, first_players=(0, 1),
+               log=None):
+    """Builds an opening book offline and writes it to a file.
+
+    Every position reachable within the first plies moves, from the empty
+    board with either player moving first, is searched to the given depth.
+    Positions are expanded level by level and keyed by their canonical
+    image, so transpositions and symmetric positions are searched once, and
+    each level is searched across a process pool.
+
+    Args:
+        path: The book file to write.
+        plies: Positions with fewer than this many moves played are booked.
+        depth: The alpha-beta search depth for every position.
+        workers: The number of worker processes, None for one per CPU.
+        first_players: The players (indices into MARKERS) to start from.
+        log: A function called with a progress message per level, or None.
+
+    Return:
+        The number of entries written.
+    """
+    level = {}
+    for player in first_players:
+        game = GameState(player)
+        key, t = canonical(game)
+        level[key] = transform(game, t).encode()
+
+    entries = {}
+    with ProcessPoolExecutor(workers) as executor:
+        for ply in range(plies):
+            start = time.perf_counter()
+            codes = list(level.values())
+            results = executor.map(_search_position, codes,
+                                   [depth] * len(codes), chunksize=4)
+            for key, move, score, searched in results:
+                if move is not None:
+                    entries[key] = (score, move, searched)
+            if log is not None:
+                log('ply {}: {} positions in {:.1f}s'.format(
+                    ply, len(codes), time.perf_counter() - start))
+
+            # Expand every legal move to reach the next level
+            following = {}
+            if ply + 1 < plies:
+                for code in codes:
+                    game = GameState.decode(code)
+                    for move in unique_moves(game.legal_moves(),
+                                             symmetries(game)):
+                        game.make_move(move)
+                        key, t = canonical(game)
+                        if key not in following:
+                            following[key] = transform(game, t).encode()
+                        game.undo()
+            level = following
+
+    write_book(path, entries)
+    return len(entries)
+
+
+def write_book(path, entries):
+    """Writes book entries to a file sorted by position hash.
+
+    Args:
+        path: The book file to write.
+        entries: A dictionary mapping canonical keys to tuples of the
+          score, best move and depth.
+    """
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for key in sorted(entries):
+            score, move, depth = entries[key]
+            f.write(ENTRY.pack(key, score, move, depth))
+
+
+class OpeningBook:
+    """A memory-mapped opening book with binary search lookups.
+
+    The book file is mapped read only rather than read into memory, so
+    every process using the same book shares the operating system's page
+    cache and a lookup costs a binary search over the sorted entries.
+
+    Attributes:
+        path: The book file.
+        count: The number of entries in the book.
+        hits: The number of lookups that found the position.
+        misses: The number of lookups that did not.
+    """
+
+    def __init__(self, path):
+        """Maps the book file.
+
+        Raises:
+            ValueError: The file is not a book of this VERSION.
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a version {} opening book'.format(
+                path, VERSION))
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmaps and closes the book file."""
+        self.map.close()
+        self.file.close()
+
+    def lookup(self, key):
+        """Finds a position in the book.
+
+        Args:
+            key: The canonical key of the position.
+
+        Return:
+            A tuple of the best encoded move in the position's canonical
+            image, its score for the player to move and the depth searched,
+            or None if the position is not in the book.
+        """
+        data = self.map
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * ENTRY.size
+            stored = KEY.unpack_from(data, offset)[0]
+            if stored < key:
+                low = middle + 1
+            elif stored > key:
+                high = middle
+            else:
+                self.hits += 1
+                stored, score, move, depth = ENTRY.unpack_from(data, offset)
+                return move, score, depth
+        self.misses += 1
+        return None
+
+    def move_for(self, game):
+        """Returns the book move for a position if it is legal, else None.
+
+        The position is looked up by its canonical key, and the stored move
+        is mapped back from the canonical image to the position.
+        """
+        key, t = canonical(game)
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        move = CELL_MAPS[INVERSE[t]][entry[0]]
+        if not game.is_legal(move // 9, move % 9):
+            return None
+        return move
+
+
+def main(argv=None):
+    """Builds or probes an opening book from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Build or probe an Ultimate Tic-Tac-Toe opening book.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book offline')
+    build.add_argument('path')
+    build.add_argument('--plies', type=int, default=2)
+    build.add_argument('--depth', type=int, default=6)
+    build.add_argument('-w', '--workers', type=int, default=None)
+    probe = commands.add_parser('probe', help='look up the opening moves')
+    probe.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = build_book(args.path, args.plies, args.depth, args.workers,
+                           log=print)
+        print('Wrote {} positions to {}'.format(count, args.path))
+    else:
+        with OpeningBook(args.path) as book:
+            for player in (0, 1):
+                entry = book.lookup(canonical(GameState(player))[0])
+                print('{} positions; empty board, player {} to move: {}'
+                      .format(len(book), player, entry))
+
+
+if __name__ == '__main__':
+    main()
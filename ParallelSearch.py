@@ -0,0 +1,206 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from GameState import GameState
+from Search import *
+from Symmetry import symmetries, unique_moves
+
+# The AlphaBetaSearch counters summed over the root moves of a search
+COUNTERS = ('nodes', 'evaluations', 'table_hits', 'table_cutoffs',
+            'cutoffs', 'expanded', 'root_moves')
+
+# Per worker process state, set up by _init_worker
+_worker_alpha = None
+_worker_search = None
+
+
+def _init_worker(shared_alpha, table_size, weights):
+    """Creates the worker's search engine and keeps the shared alpha bound."""
+    global _worker_alpha, _worker_search
+    _worker_alpha = shared_alpha
+    table = TranspositionTable(table_size) if table_size else False
+    _worker_search = AlphaBetaSearch(time_limit=None, table=table,
+                                     weights=weights)
+
+
+def _score_root_move(code, move, depth, deadline, node_limit):
+    """Scores one root move in a worker process.
+
+    The search window starts one below the best score any worker has found
+    so far in this iteration, so moves that tie the best are still scored
+    exactly and the move chosen among equals matches the serial search.
+
+    Args:
+        code: The root position as returned by GameState.encode.
+        move: The encoded root move to score.
+        depth: The depth to search, including the move itself.
+        deadline: The time.time() at which to give up, None for no limit.
+        node_limit: The node budget for this move, None for no limit.
+
+    Return:
+        A tuple of the move, its score (None if the budget ran out) and the
+        search's COUNTERS.
+    """
+    game = GameState.decode(code)
+    search = _worker_search
+    search.time_limit = None
+    if deadline is not None:
+        search.time_limit = max(0.0, deadline - time.time())
+    search.node_limit = node_limit
+    search.reset_budget()
+
+    try:
+        score = search.score_move(game, move, depth,
+                                  _worker_alpha.value - 1)
+    except SearchTimeout:
+        score = None
+    else:
+        with _worker_alpha.get_lock():
+            if score > _worker_alpha.value:
+                _worker_alpha.value = score
+    return move, score, tuple(getattr(search, name) for name in COUNTERS)
+
+
+class ParallelSearch:
+    """An alpha-beta search that splits the root moves across processes.
+
+    Each iteration of the iterative deepening submits every root move, in
+    the same order as AlphaBetaSearch and without its symmetric duplicates,
+    to a pool of worker processes. The position is sent in GameState's
+    compact encoding, and the workers share the best score found so far
+    through a shared memory value to narrow each other's windows. Without
+    transposition tables the chosen move and score at a fixed depth are
+    identical to AlphaBetaSearch with table=False.
+
+    Attributes:
+        max_depth: The deepest iteration to search, in plies.
+        time_limit: Wall clock budget per move in seconds, None for no limit.
+        node_limit: Node budget for each root move, None for no limit.
+        workers: The number of worker processes, None for one per CPU.
+        table_size: The number of buckets of each worker's own
+          TranspositionTable, None to search without tables.
+        weights: The Weights of the workers' Evaluator, or None.
+        nodes: The number of nodes visited by the most recent search.
+        depth: The depth of the deepest completed iteration.
+        score: The score of the best move from the mover's perspective.
+        counters: The COUNTERS summed over every root move searched.
+        iterations: A tuple of the depth, cumulative nodes and seconds at
+          the end of each completed iteration.
+    """
+
+    def __init__(self, max_depth=8, time_limit=1.0, node_limit=None,
+                 workers=None, table_size=None, weights=None):
+        """Initializes the search; the process pool is started on first use."""
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.workers = workers
+        self.table_size = table_size
+        self.weights = weights
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.iterations = []
+        self.ordering = AlphaBetaSearch(table=False)
+        self.executor = None
+        self.alpha = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shuts down the worker processes."""
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def _pool(self):
+        """Returns the process pool, starting it if necessary."""
+        if self.executor is None:
+            self.alpha = multiprocessing.Value('d', -INFINITY)
+            self.executor = ProcessPoolExecutor(
+                self.workers, initializer=_init_worker,
+                initargs=(self.alpha, self.table_size, self.weights))
+        return self.executor
+
+    def search(self, game):
+        """Finds the best move for the player to move.
+
+        Args:
+            game: The position to search. It is not modified.
+
+        Return:
+            The best encoded move found, or None if there are no legal moves.
+        """
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.iterations = []
+        start = time.perf_counter()
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.time() + self.time_limit
+
+        stabilizer = symmetries(game)
+        moves = unique_moves(self.ordering.order_moves(game), stabilizer)
+        if not moves:
+            return None
+        best = moves[0]
+        code = game.encode()
+        executor = self._pool()
+
+        for depth in range(1, self.max_depth + 1):
+            self.alpha.value = -INFINITY
+            futures = [executor.submit(_score_root_move, code, move, depth,
+                                       deadline, self.node_limit)
+                       for move in moves]
+            scores = {}
+            for future in futures:
+                move, score, counters = future.result()
+                for name, count in zip(COUNTERS, counters):
+                    self.counters[name] += count
+                scores[move] = score
+            self.nodes = self.counters['nodes']
+            if None in scores.values():
+                break
+
+            # The first move in search order with the highest score wins,
+            # as in AlphaBetaSearch
+            top = max(scores.values())
+            best = next(move for move in moves if scores[move] == top)
+            self.score, self.depth = top, depth
+            self.iterations.append(
+                (depth, self.nodes, time.perf_counter() - start))
+            if abs(top) >= WIN_SCORE - self.max_depth:
+                break
+            moves = unique_moves(self.ordering.order_moves(game, best),
+                                 stabilizer)
+        return best
+
+    def stats(self):
+        """Returns the counters of the most recent search as a dictionary.
+
+        The counters are summed over the workers, in the format of
+        AlphaBetaSearch.stats.
+        """
+        counters = self.counters
+        children = counters['nodes'] - counters['root_moves']
+        expanded = counters['expanded']
+        return {
+            'nodes': self.nodes,
+            'depth': self.depth,
+            'score': self.score,
+            'evaluations': counters['evaluations'],
+            'table_hits': counters['table_hits'],
+            'table_cutoffs': counters['table_cutoffs'],
+            'cutoffs': counters['cutoffs'],
+            'branching': children / expanded if expanded else 0.0,
+            'iterations': [{'depth': depth, 'nodes': nodes,
+                            'seconds': seconds}
+                           for depth, nodes, seconds in self.iterations],
+        }
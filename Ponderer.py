@@ -0,0 +1,147 @@
+import threading
+from Search import AlphaBetaSearch, WIN_SCORE
+from MonteCarloSearch import MonteCarloSearch
+
+
+class Ponderer:
+    """Searches on the opponent's time in a background thread.
+
+    With an AlphaBetaSearch, the ponderer predicts the opponent's reply
+    with a shallow search, then searches the AI's answer to the predicted
+    position until the opponent moves. Both searches write to the AI's
+    TranspositionTable. If the prediction is right, the AI's own search
+    starts from a warm table, or is skipped when pondering already
+    completed it. If it is wrong, pondering is abandoned, and the table
+    still holds the opponent's replies searched for the prediction.
+
+    With a MonteCarloSearch, the kept tree is grown from the opponent's
+    position, and the AI's search reuses the subtree of the move played.
+
+    The background search runs on a copy of the game, so the game may be
+    played in while pondering. Pondering stops within CHECK_INTERVAL nodes
+    or 64 playouts of finish being called.
+
+    Attributes:
+        searcher: The AI's AlphaBetaSearch or MonteCarloSearch.
+        predict_depth: The depth of the search predicting the reply.
+        prediction: The predicted reply of the most recent pondering, or
+          None.
+        result: A tuple of the best move, score and depth of the deepest
+          completed search of the predicted position, or None.
+        hits: The number of times pondering predicted the move played.
+        misses: The number of times it did not.
+    """
+
+    def __init__(self, searcher, predict_depth=4):
+        """Initializes the ponderer for the AI's search engine.
+
+        Raises:
+            ValueError: The searcher is not an AlphaBetaSearch or a
+              MonteCarloSearch.
+        """
+        if not isinstance(searcher, (AlphaBetaSearch, MonteCarloSearch)):
+            raise ValueError('Pondering needs an AlphaBetaSearch or a '
+                             'MonteCarloSearch, not {}'.format(
+                                 type(searcher).__name__))
+        self.searcher = searcher
+        self.predict_depth = predict_depth
+        self.prediction = None
+        self.predicted_hash = None
+        self.result = None
+        self.hits = 0
+        self.misses = 0
+        self.thread = None
+        self.interrupt = threading.Event()
+        self.limits = None
+
+    def start(self, game):
+        """Starts pondering a position with the opponent to move.
+
+        Args:
+            game: The position after the AI's move. It is copied, not
+              modified.
+        """
+        self.finish()
+        self.prediction = None
+        self.predicted_hash = None
+        self.result = None
+        if game.winner is not None:
+            return
+        self.interrupt.clear()
+
+        searcher = self.searcher
+        if isinstance(searcher, MonteCarloSearch):
+            # Search until interrupted, whatever the per move budget is
+            self.limits = searcher.playout_limit, searcher.time_limit
+            searcher.playout_limit = searcher.time_limit = None
+            searcher.interrupt = self.interrupt
+            target = searcher.search
+        else:
+            target = self._ponder_alphabeta
+        self.thread = threading.Thread(target=target, args=(game.copy(),),
+                                       daemon=True)
+        self.thread.start()
+
+    def _ponder_alphabeta(self, game):
+        """Predicts the opponent's reply and searches the AI's answer."""
+        search = AlphaBetaSearch(self.searcher.max_depth, time_limit=None,
+                                 table=self.searcher.table or False,
+                                 weights=self.searcher.weights)
+        search.interrupt = self.interrupt
+        search.reset_budget()
+        prediction = None
+        for move, score, depth in search.iterate(game):
+            prediction = move
+            if depth >= self.predict_depth:
+                break
+        if prediction is None or self.interrupt.is_set():
+            return
+
+        game.make_move(prediction)
+        self.prediction = prediction
+        self.predicted_hash = game.hash
+        for result in search.iterate(game):
+            self.result = result
+
+    def finish(self, game=None):
+        """Stops pondering once the opponent has moved.
+
+        Args:
+            game: The position after the opponent's move, with the AI to
+              move, or None to stop without using the result.
+
+        Return:
+            The AI's move if pondering completed the AI's search of this
+            position, otherwise None.
+        """
+        if self.thread is None:
+            return None
+        self.interrupt.set()
+        self.thread.join()
+        self.thread = None
+
+        searcher = self.searcher
+        if isinstance(searcher, MonteCarloSearch):
+            searcher.playout_limit, searcher.time_limit = self.limits
+            searcher.interrupt = None
+            if game is not None and searcher.root is not None:
+                if any(child.hash == game.hash
+                       for child in searcher.root.children):
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return None
+
+        if game is None or self.prediction is None:
+            return None
+        if game.hash != self.predicted_hash:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.result is None:
+            return None
+        move, score, depth = self.result
+        max_depth = searcher.max_depth
+        if depth >= max_depth or abs(score) >= WIN_SCORE - max_depth:
+            return move
+        return None
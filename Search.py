@@ -0,0 +1,361 @@
+import time
+from GameState import *
+from TranspositionTable import *
+from Symmetry import symmetries, unique_moves
+from Evaluation import Evaluator
+
+# Scores beyond any heuristic value, reduced by the ply at which the game
+# ends so that faster wins (and slower losses) are preferred
+WIN_SCORE = 1000000
+INFINITY = float('inf')
+
+# Scores at least this large are wins or losses at a known distance
+WIN_BOUND = WIN_SCORE - 1000
+
+# How many nodes are searched between checks of the time budget
+CHECK_INTERVAL = 1024
+
+
+def to_table(score, ply):
+    """Converts a win/loss score to its distance from the stored position."""
+    if score >= WIN_BOUND:
+        return score + ply
+    if score <= -WIN_BOUND:
+        return score - ply
+    return score
+
+
+def from_table(score, ply):
+    """Converts a stored win/loss score back to its distance from the root."""
+    if score >= WIN_BOUND:
+        return score - ply
+    if score <= -WIN_BOUND:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time or node budget is exhausted."""
+
+
+class AlphaBetaSearch:
+    """A depth-limited negamax search with alpha-beta pruning.
+
+    The search deepens iteratively from depth 1 until max_depth is reached or
+    the time/node budget runs out, in which case the best move of the deepest
+    completed iteration is returned. Moves are applied to the GameState in
+    place and reverted, so no board is allocated per node. Moves are ordered
+    by how much they improve the mover's inner_heuristic score and reduce the
+    opponent's, with the best move from the transposition table (or the
+    previous iteration at the root) searched first. Root moves that are
+    symmetric images of an earlier root move are skipped, as they score the
+    same.
+
+    Attributes:
+        max_depth: The deepest iteration to search, in plies.
+        time_limit: Wall clock budget per move in seconds, None for no limit.
+        node_limit: Node budget per move, None for no limit.
+        nodes: The number of nodes visited by the most recent search.
+        depth: The depth of the deepest completed iteration.
+        score: The score of the best move from the mover's perspective.
+        table: The TranspositionTable shared by every search, None to search
+          without one.
+        interrupt: A threading.Event that ends the search as if the budget
+          had run out once it is set, or None.
+        evaluations: The number of leaves scored by evaluate.
+        table_hits: The number of nodes found in the table.
+        table_cutoffs: The number of nodes answered by the table alone.
+        cutoffs: The number of nodes whose remaining moves were pruned.
+        expanded: The number of nodes whose moves were searched.
+        root_moves: The number of root moves searched, over all iterations.
+        iterations: A tuple of the depth, cumulative nodes and seconds at
+          the end of each completed iteration.
+        weights: The Weights of the Evaluator scoring the leaves, or None
+          to score them with GameState.heuristic.
+    """
+
+    def __init__(self, max_depth=8, time_limit=1.0, node_limit=None,
+                 table=None, weights=None):
+        """Initializes the search with the given depth and budget.
+
+        A default sized TranspositionTable is created if none is given; pass
+        False to search without one.
+        """
+        if table is None:
+            table = TranspositionTable()
+        self.table = table or None
+        self.weights = weights
+        self.evaluator = Evaluator(weights) if weights is not None else None
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.deadline = None
+        self.max_nodes = INFINITY
+        self.interrupt = None
+        self.reset_counters()
+
+    def evaluate(self, game):
+        """Scores a position from the perspective of the player to move.
+
+        Return:
+            The difference between the heuristic of the player to move and
+            that of the opponent, or the Evaluator's score if the search
+            has weights.
+        """
+        if self.evaluator is not None:
+            return self.evaluator.evaluate(game)
+        return game.heuristic(game.player) - game.heuristic(1 - game.player)
+
+    def order_moves(self, game, first=None):
+        """Sorts the legal moves so the most promising are searched first.
+
+        Each move is scored by the change it makes to the mover's
+        inner_heuristic on its InnerBoard plus the opponent's score it takes
+        away by blocking lines.
+
+        Args:
+            game: The position to generate moves for.
+            first: A move to search before all others, if legal.
+
+        Return:
+            A list of encoded legal moves, best first.
+        """
+        player = game.player
+        mine, theirs = HEURISTICS[player], HEURISTICS[1 - player]
+        x, o = game.cells
+        scored = []
+        for move in game.iter_moves():
+            inner = move // 9
+            before = TERNARY[x[inner]] + 2 * TERNARY[o[inner]]
+            # Placing a marker adds its digit to the base 3 index
+            after = before + (player + 1) * TERNARY[1 << move % 9]
+            gain = (mine[after] - mine[before]
+                    + theirs[before] - theirs[after])
+            if move == first:
+                gain = INFINITY
+            scored.append((gain, move))
+        scored.sort(reverse=True)
+        return [move for gain, move in scored]
+
+    def search(self, game):
+        """Finds the best move for the player to move.
+
+        Args:
+            game: The position to search. It is restored before returning.
+
+        Return:
+            The best encoded move found, or None if there are no legal moves.
+        """
+        self.reset_budget()
+        best = None
+        for move, score, depth in self.iterate(game):
+            best, self.score, self.depth = move, score, depth
+        if best is None:
+            # No iteration completed within the budget
+            moves = self.order_moves(game)
+            best = moves[0] if moves else None
+        return best
+
+    def iterate(self, game):
+        """Deepens the search iteratively, yielding each iteration's result.
+
+        The iterations end at max_depth, once a win or loss is found, or
+        when the budget runs out. The budget is not reset, see
+        reset_budget.
+
+        Args:
+            game: The position to search. It is restored before each
+              iteration's result is yielded and when the budget runs out.
+
+        Yields:
+            A tuple of the best move, its score and the depth of every
+            completed iteration.
+        """
+        stabilizer = symmetries(game)
+        moves = unique_moves(self.order_moves(game), stabilizer)
+        if not moves:
+            return
+        base = len(game.history)
+        start = time.perf_counter()
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                move, score = self._root(game, moves, depth)
+            except SearchTimeout:
+                # Unwind the moves that were in flight when time ran out
+                while len(game.history) > base:
+                    game.undo()
+                return
+            self.iterations.append(
+                (depth, self.nodes, time.perf_counter() - start))
+            yield move, score, depth
+            if abs(score) >= WIN_SCORE - self.max_depth:
+                return
+            moves = unique_moves(self.order_moves(game, move), stabilizer)
+
+    def reset_budget(self):
+        """Clears the search counters and starts a new time/node budget."""
+        self.reset_counters()
+        self.deadline = None
+        self.max_nodes = INFINITY
+        if self.node_limit is not None:
+            self.max_nodes = self.node_limit
+        if self.time_limit is not None:
+            self.deadline = time.perf_counter() + self.time_limit
+
+    def reset_counters(self):
+        """Clears the counters describing the most recent search."""
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.evaluations = 0
+        self.table_hits = 0
+        self.table_cutoffs = 0
+        self.cutoffs = 0
+        self.expanded = 0
+        self.root_moves = 0
+        self.iterations = []
+
+    def stats(self):
+        """Returns the counters of the most recent search as a dictionary.
+
+        The branching factor is the mean number of moves searched at each
+        expanded node, after pruning.
+        """
+        children = self.nodes - self.root_moves
+        return {
+            'nodes': self.nodes,
+            'depth': self.depth,
+            'score': self.score,
+            'evaluations': self.evaluations,
+            'table_hits': self.table_hits,
+            'table_cutoffs': self.table_cutoffs,
+            'cutoffs': self.cutoffs,
+            'branching': children / self.expanded if self.expanded else 0.0,
+            'iterations': [{'depth': depth, 'nodes': nodes,
+                            'seconds': seconds}
+                           for depth, nodes, seconds in self.iterations],
+        }
+
+    def score_move(self, game, move, depth, alpha=-INFINITY):
+        """Scores a single root move to the given depth.
+
+        The move is searched with a window above alpha, so the returned score
+        is exact if it exceeds alpha and otherwise an upper bound no greater
+        than alpha. The budget is not reset, see reset_budget.
+
+        Args:
+            game: The position before the move. It is restored on return.
+            move: The encoded move to score.
+            depth: The depth to search, including the move itself.
+            alpha: The score the move must beat to be of interest.
+
+        Return:
+            The score of the move from the mover's perspective.
+
+        Raises:
+            SearchTimeout: The time or node budget has been exhausted.
+        """
+        base = len(game.history)
+        self.root_moves += 1
+        game.make_move(move)
+        try:
+            score = -self._negamax(game, depth - 1, -INFINITY, -alpha, 1)
+        except SearchTimeout:
+            while len(game.history) > base:
+                game.undo()
+            raise
+        game.undo()
+        return score
+
+    def _root(self, game, moves, depth):
+        """Searches every root move to the given depth.
+
+        Return:
+            A tuple of the best move and its score.
+        """
+        alpha = -INFINITY
+        best = moves[0]
+        for move in moves:
+            score = self.score_move(game, move, depth, alpha)
+            if score > alpha:
+                alpha = score
+                best = move
+        return best, alpha
+
+    def _negamax(self, game, depth, alpha, beta, ply):
+        """Scores a position with alpha-beta pruning.
+
+        Return:
+            The score of the position from the perspective of the player to
+            move.
+
+        Raises:
+            SearchTimeout: The time or node budget has been exhausted.
+        """
+        self.nodes += 1
+        if self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+        if self.nodes % CHECK_INTERVAL == 0:
+            self._check_time()
+
+        if game.winner is not None:
+            if game.winner == TIE:
+                return 0
+            # Only the player who just moved can have completed a line
+            return ply - WIN_SCORE
+
+        table = self.table
+        first = None
+        if table is not None:
+            entry = table.probe(game.hash)
+            if entry is not None:
+                self.table_hits += 1
+                stored_depth, flag, score, first = entry
+                if stored_depth >= depth:
+                    score = from_table(score, ply)
+                    if (flag == EXACT or flag == LOWER and score >= beta
+                            or flag == UPPER and score <= alpha):
+                        self.table_cutoffs += 1
+                        return score
+
+        if depth == 0:
+            self.evaluations += 1
+            score = self.evaluate(game)
+            if table is not None:
+                table.store(game.hash, 0, EXACT, score, -1)
+            return score
+
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = -1
+        self.expanded += 1
+        for move in self.order_moves(game, first):
+            game.make_move(move)
+            score = -self._negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            game.undo()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        break
+
+        if table is not None:
+            if best <= original_alpha:
+                flag = UPPER
+            elif best >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            table.store(game.hash, depth, flag, to_table(best, ply), best_move)
+        return best
+
+    def _check_time(self):
+        """Raises SearchTimeout once the time budget is exhausted."""
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        if self.interrupt is not None and self.interrupt.is_set():
+            raise SearchTimeout()
@@ -0,0 +1,243 @@
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+from GameState import POPCOUNT
+from GameRecord import to_notation
+
+
+class SearchMonitor:
+    """Collects metrics of every move a TictacPlayer chooses.
+
+    The player reports the start and end of each move and times each phase
+    of its decision (opening book, endgame solver, search or greedy) through
+    the monitor. A record of the move is then built from the phase timings
+    and the counters of the engines that ran, written as one JSON line and
+    passed to every hook, so that metrics can be aggregated across many
+    games to find slow phases and pathological positions.
+
+    Attributes:
+        hooks: Functions called with each move's record as it is finished.
+        profile: True to profile every move with cProfile. It may be
+          switched on and off between moves.
+        profiler: The cProfile.Profile accumulating the profiled moves, or
+          None until a move is profiled.
+        moves: The number of moves recorded.
+        last: The record of the most recent move, or None.
+    """
+
+    def __init__(self, path=None, hooks=(), profile=False):
+        """Initializes the monitor.
+
+        Args:
+            path: A file to append a JSON line per move to, or None.
+            hooks: Functions to call with each move's record.
+            profile: True to profile every move with cProfile.
+        """
+        self.file = open(path, 'a') if path else None
+        self.hooks = list(hooks)
+        self.profile = profile
+        self.profiler = None
+        self.moves = 0
+        self.last = None
+        self.record = None
+        self.start = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the metrics file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def add_hook(self, hook):
+        """Calls hook with the record of every following move."""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Stops calling a hook added with add_hook."""
+        self.hooks.remove(hook)
+
+    def start_move(self, game):
+        """Starts timing a move from the given position."""
+        x, o = game.cells
+        self.record = {
+            'position': to_notation(game),
+            'ply': sum(POPCOUNT[x[inner]] + POPCOUNT[o[inner]]
+                       for inner in range(9)),
+            'legal_moves': len(game.legal_moves()),
+            'phases': {},
+        }
+        if self.profile:
+            if self.profiler is None:
+                self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start = time.perf_counter()
+
+    def phase(self, name, function, *args):
+        """Times one phase of the move.
+
+        The phase that returns a move is recorded as the move's source.
+
+        Return:
+            The result of calling function with args.
+        """
+        start = time.perf_counter()
+        result = function(*args)
+        self.record['phases'][name] = time.perf_counter() - start
+        if result is not None:
+            self.record['source'] = name
+        return result
+
+    def finish_move(self, player, move):
+        """Finishes the record of a move and reports it.
+
+        Args:
+            player: The TictacPlayer that chose the move.
+            move: The encoded move chosen.
+
+        Return:
+            The move's record.
+        """
+        seconds = time.perf_counter() - self.start
+        if self.profile and self.profiler is not None:
+            self.profiler.disable()
+
+        record = self.record
+        record.update(mode=player.mode, marker=player.my_marker, move=move,
+                      seconds=seconds)
+        phases = record['phases']
+        if 'search' in phases:
+            record['search'] = player.searcher.stats()
+        solver = player.endgame
+        if 'endgame' in phases and solver.applies(player.game):
+            record['endgame'] = solver.stats()
+            if solver.solution is not None:
+                record['endgame']['result'] = solver.solution.result
+                record['endgame']['distance'] = solver.solution.distance
+
+        self.record = None
+        self.last = record
+        self.moves += 1
+        if self.file is not None:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+        for hook in self.hooks:
+            hook(record)
+        return record
+
+    def print_profile(self, limit=20, sort='cumulative', stream=None):
+        """Prints the profile of the profiled moves, if any."""
+        if self.profiler is None:
+            return
+        stats = pstats.Stats(self.profiler, stream=stream or sys.stdout)
+        stats.sort_stats(sort).print_stats(limit)
+
+    def dump_profile(self, path):
+        """Saves the profile of the profiled moves for pstats or snakeviz."""
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)
+
+
+def read_metrics(path):
+    """Streams the move records of a JSON lines metrics file."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def percentile(sorted_values, fraction):
+    """Returns the nearest-rank percentile of a sorted list."""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize(records, top=5):
+    """Aggregates move records by mode.
+
+    Args:
+        records: An iterable of move records, as written by SearchMonitor.
+        top: The number of slowest moves to keep per mode.
+
+    Return:
+        A dictionary mapping each mode to its number of moves, the p50,
+        p99 and maximum seconds per move, the total seconds of each phase,
+        how often each phase supplied the move, the mean nodes, nodes per
+        second and branching factor of its searches, and its slowest moves.
+    """
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record['mode'], {
+            'seconds': [], 'phases': {}, 'sources': {}, 'nodes': 0,
+            'search_seconds': 0.0, 'branching': [], 'slowest': []})
+        group['seconds'].append(record['seconds'])
+        for name, seconds in record['phases'].items():
+            group['phases'][name] = group['phases'].get(name, 0.0) + seconds
+        source = record.get('source')
+        group['sources'][source] = group['sources'].get(source, 0) + 1
+        search = record.get('search')
+        if search is not None and 'nodes' in search:
+            group['nodes'] += search['nodes']
+            group['search_seconds'] += record['phases']['search']
+            group['branching'].append(search['branching'])
+        group['slowest'].append((record['seconds'], record['position']))
+        group['slowest'] = sorted(group['slowest'], reverse=True)[:top]
+
+    summary = {}
+    for mode, group in groups.items():
+        seconds = sorted(group['seconds'])
+        branching = group['branching']
+        summary[mode] = {
+            'moves': len(seconds),
+            'p50_seconds': percentile(seconds, 0.50),
+            'p99_seconds': percentile(seconds, 0.99),
+            'max_seconds': seconds[-1],
+            'phase_seconds': group['phases'],
+            'sources': group['sources'],
+            'mean_nodes': group['nodes'] / len(branching) if branching
+            else 0.0,
+            'nodes_per_second': group['nodes'] / group['search_seconds']
+            if group['search_seconds'] else 0.0,
+            'mean_branching': sum(branching) / len(branching) if branching
+            else 0.0,
+            'slowest': group['slowest'],
+        }
+    return summary
+
+
+def main(argv=None):
+    """Summarizes a metrics file from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Aggregate per-move search metrics.')
+    parser.add_argument('path', help='JSON lines metrics file')
+    parser.add_argument('--top', type=int, default=5,
+                        help='slowest moves to list per mode')
+    args = parser.parse_args(argv)
+
+    for mode, stats in summarize(read_metrics(args.path), args.top).items():
+        print('{}: {} moves, p50 {:.4f}s, p99 {:.4f}s, max {:.4f}s'.format(
+            mode, stats['moves'], stats['p50_seconds'], stats['p99_seconds'],
+            stats['max_seconds']))
+        print('  phases: {}'.format(', '.join(
+            '{} {:.2f}s'.format(name, seconds)
+            for name, seconds in stats['phase_seconds'].items())))
+        print('  sources: {}'.format(stats['sources']))
+        if stats['mean_nodes']:
+            print('  {:.0f} nodes per search, {:.0f} nodes/sec, branching '
+                  '{:.2f}'.format(stats['mean_nodes'],
+                                  stats['nodes_per_second'],
+                                  stats['mean_branching']))
+        for seconds, position in stats['slowest']:
+            print('  {:.4f}s  {}'.format(seconds, position))
+
+
+if __name__ == '__main__':
+    main()
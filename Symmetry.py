@@ -0,0 +1,154 @@
+from GameState import *
+
+# The 8 symmetries of the square as maps of a 3x3 board's spaces: the
+# identity, the rotations by 90, 180 and 270 degrees, the reflections in
+# the vertical and horizontal axes and in the two diagonals. Symmetry t
+# moves space i to SPACE_MAPS[t][i]. The whole board is transformed by
+# applying the same symmetry to the InnerBoards and to every InnerBoard's
+# spaces.
+_COORDINATES = (
+    lambda r, c: (r, c),
+    lambda r, c: (c, 2 - r),
+    lambda r, c: (2 - r, 2 - c),
+    lambda r, c: (2 - c, r),
+    lambda r, c: (r, 2 - c),
+    lambda r, c: (2 - r, c),
+    lambda r, c: (c, r),
+    lambda r, c: (2 - c, 2 - r),
+)
+SPACE_MAPS = tuple(
+    tuple(3 * row + col for row, col in
+          (transform(space // 3, space % 3) for space in range(9)))
+    for transform in _COORDINATES)
+IDENTITY = 0
+
+# INVERSE[t] is the symmetry undoing symmetry t
+INVERSE = tuple(
+    next(u for u in range(8)
+         if all(SPACE_MAPS[u][SPACE_MAPS[t][i]] == i for i in range(9)))
+    for t in range(8))
+
+# CELL_MAPS[t][move] is the image of an encoded move (inner * 9 + space)
+CELL_MAPS = tuple(
+    tuple(spaces[cell // 9] * 9 + spaces[cell % 9] for cell in range(81))
+    for spaces in SPACE_MAPS)
+
+
+def _xor_table(values):
+    """Returns the XOR of the values selected by each 9-bit mask.
+
+    Entry mask is built from the entry without its lowest bit, so the 512
+    entries cost one XOR each.
+    """
+    table = [0] * 512
+    for mask in range(1, 512):
+        low = mask & -mask
+        table[mask] = table[mask ^ low] ^ values[low.bit_length() - 1]
+    return tuple(table)
+
+
+# MASK_MAPS[t][mask] is the image of a 9-bit mask
+MASK_MAPS = tuple(_xor_table([1 << space for space in spaces])
+                  for spaces in SPACE_MAPS)
+
+# BOARD_KEYS[player][inner][mask] is the XOR of the Zobrist keys of the
+# player's markers in mask on InnerBoard inner
+BOARD_KEYS = tuple(
+    tuple(_xor_table(ZOBRIST_CELLS[player][inner * 9:inner * 9 + 9])
+          for inner in range(9))
+    for player in range(2))
+
+
+def transformed_hash(game, t):
+    """Returns the Zobrist hash the position would have after symmetry t.
+
+    The transformed position is not built, so this costs 18 table lookups.
+    """
+    spaces = SPACE_MAPS[t]
+    masks = MASK_MAPS[t]
+    target = game.target
+    key = ZOBRIST_TARGET[spaces[target] + 1 if target >= 0 else 0]
+    if game.player:
+        key ^= ZOBRIST_PLAYER
+    for player in range(2):
+        keys = BOARD_KEYS[player]
+        cells = game.cells[player]
+        for inner in range(9):
+            mask = cells[inner]
+            if mask:
+                key ^= keys[spaces[inner]][masks[mask]]
+    return key
+
+
+def canonical(game):
+    """Finds the canonical form of a position among its 8 symmetric images.
+
+    The canonical image is the one with the smallest Zobrist hash, so every
+    symmetric image of a position has the same canonical key.
+
+    Return:
+        A tuple of the canonical key and the symmetry mapping the position
+        to its canonical image.
+    """
+    return min((transformed_hash(game, t), t) for t in range(8))
+
+
+def transform(game, t):
+    """Returns a new GameState holding the image of a position.
+
+    The target InnerBoard is transformed too; the undo history is not kept.
+    """
+    spaces = SPACE_MAPS[t]
+    masks = MASK_MAPS[t]
+    x, o, player, target = game.encode()
+    images = [0, 0]
+    for index, cells in enumerate((x, o)):
+        for inner in range(9):
+            mask = cells >> 9 * inner & FULL
+            images[index] |= masks[mask] << 9 * spaces[inner]
+    if target >= 0:
+        target = spaces[target]
+    return GameState.decode((images[0], images[1], player, target))
+
+
+def symmetries(game):
+    """Returns the symmetries mapping a position, target included, to itself.
+
+    Return:
+        A tuple of symmetries, always starting with IDENTITY.
+    """
+    x, o = game.cells
+    target = game.target
+    found = []
+    for t in range(8):
+        spaces = SPACE_MAPS[t]
+        masks = MASK_MAPS[t]
+        if target >= 0 and spaces[target] != target:
+            continue
+        if all(x[spaces[inner]] == masks[x[inner]]
+               and o[spaces[inner]] == masks[o[inner]]
+               for inner in range(9)):
+            found.append(t)
+    return tuple(found)
+
+
+def unique_moves(moves, stabilizer):
+    """Drops moves that are symmetric duplicates of an earlier move.
+
+    Args:
+        moves: The encoded moves of a position, in search order.
+        stabilizer: The position's symmetries, as returned by symmetries.
+
+    Return:
+        The first move of every class of equivalent moves, in the same
+        order.
+    """
+    if len(stabilizer) == 1:
+        return moves
+    unique = []
+    seen = set()
+    for move in moves:
+        if move not in seen:
+            unique.append(move)
+            seen.update(CELL_MAPS[t][move] for t in stabilizer)
+    return unique
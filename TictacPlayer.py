@@ -1,7 +1,16 @@
 import random
-import numpy as np
-import copy
+import time
 from InnerBoard import *
+from GameState import GameState, BITS, FULL
+from Search import AlphaBetaSearch
+
+# The other engines, the opening book, the monitor, the ponderer and the
+# console view are imported only when a player needs them, so that
+# importing this module stays cheap for short-lived worker processes.
+
+# The share of the per move time_limit the EndgameSolver created for
+# endgame=True may spend; the search gets whatever the solver leaves
+ENDGAME_SHARE = 0.5
 
 
 class TictacPlayer:
@@ -9,24 +18,116 @@ class TictacPlayer:
 
     Within this class, the Artificial Intelligence player for the game is
     created. This player utilizes a simple heuristic to assess which move is
-    most appropriate for execution.
+    most appropriate for execution, either greedily over its own moves or
+    through an alpha-beta search that also considers the opponent's replies.
 
     Attributes:
         my_marker: The AI's marker as a string representation of 'X' or 'O'.
         op_marker: The AI's opponent's marker represented in the same manner.
-        board: The board represented as a 3x3 numpy array of InnerBoard objects.
+        game: The GameState engine holding the markers of the whole board.
+        board: The board represented as a 3x3 list of lists of InnerBoard
+          objects, each a view over the game engine.
         condition: The state of the larger board in terms of a smaller game
         winner: Which player has won the larger board.
+        mode: How moves are selected, one of MODES.
+        searcher: The AlphaBetaSearch used in 'alphabeta' mode, or the
+          ParallelSearch used in 'parallel' mode, or the MonteCarloSearch
+          used in 'mcts' mode, or None in 'greedy' mode.
+        book: The OpeningBook consulted before any search, or None.
+        endgame: The EndgameSolver used once few spaces remain, or None.
+        endgame_time: Seconds the endgame solver spent on the current move
+          without solving it, taken from the search's time_limit.
+        monitor: The SearchMonitor recording every move chosen, or None.
+        ponderer: The Ponderer searching on the opponent's time, or None.
     """
-    board = []
-    markers = ['X', 'O']
+    markers = ('X', 'O')
+    MODES = ('greedy', 'alphabeta', 'parallel', 'mcts')
 
-    def __init__(self):
+    def __init__(self, mode='greedy', time_limit=1.0, max_depth=8,
+                 node_limit=None, workers=None, playout_limit=None,
+                 book=None, endgame=False, monitor=None, ponder=False,
+                 weights=None):
         """Initializes the TictacPlayer object.
 
         Creates the TictacPlayer object with either 'X' or 'O' randomly and
-        shapes the board into a 3x3 numpy array of InnerBoard objects.
+        shapes the board into a 3x3 grid of InnerBoard objects.
+
+        Args:
+            mode: 'greedy' to pick the best scoring move one ply ahead,
+              'alphabeta' to search with AlphaBetaSearch, or 'parallel' to
+              search with ParallelSearch across worker processes, or 'mcts'
+              to search with MonteCarloSearch.
+            time_limit: Seconds the search may spend per move.
+            max_depth: The deepest iteration the search may reach.
+            node_limit: Nodes the search may visit per move, None for no
+              limit.
+            workers: Worker processes for 'parallel' mode, None for one per
+              CPU.
+            playout_limit: Playouts per move for 'mcts' mode, None to rely on
+              time_limit.
+            book: An OpeningBook, or the path of a book file, whose moves
+              are played whenever the position is in the book.
+            endgame: True to play perfect moves with an EndgameSolver once
+              the position is small enough to solve within its node budget
+              and ENDGAME_SHARE of time_limit, or an EndgameSolver to use.
+            monitor: A SearchMonitor, or the path of a JSON lines file to
+              record a SearchMonitor's metrics of every move in.
+            ponder: True to keep searching in a background thread while
+              the opponent thinks, see ponder.
+            weights: The Weights, or the path of a file saved with
+              save_weights, of the Evaluator scoring the leaves of the
+              'alphabeta' and 'parallel' searches. None keeps the
+              GameState heuristic.
+
+        Raises:
+            ValueError: The mode is not one of MODES, pondering was
+              requested in a mode other than 'alphabeta' or 'mcts', or
+              weights in a mode other than 'alphabeta' or 'parallel'.
         """
+        if mode not in self.MODES:
+            raise ValueError('Unknown mode {}, expected one of {}'.format(
+                mode, self.MODES))
+        self.mode = mode
+        if weights is not None and mode not in ('alphabeta', 'parallel'):
+            raise ValueError('Evaluation weights need the alphabeta or '
+                             'parallel mode, not {}'.format(mode))
+        if isinstance(weights, str):
+            from Evaluation import load_weights
+            weights = load_weights(weights)
+        if mode == 'parallel':
+            from ParallelSearch import ParallelSearch
+            self.searcher = ParallelSearch(max_depth, time_limit, node_limit,
+                                           workers, weights=weights)
+        elif mode == 'mcts':
+            from MonteCarloSearch import MonteCarloSearch
+            self.searcher = MonteCarloSearch(playout_limit, time_limit)
+        elif mode == 'alphabeta':
+            self.searcher = AlphaBetaSearch(max_depth, time_limit, node_limit,
+                                            weights=weights)
+        else:
+            self.searcher = None
+        if isinstance(book, str):
+            from OpeningBook import OpeningBook
+            book = OpeningBook(book)
+        self.book = book
+        if endgame is True:
+            from EndgameSolver import EndgameSolver
+            endgame = EndgameSolver(time_limit=None if time_limit is None
+                                    else time_limit * ENDGAME_SHARE)
+        self.endgame = endgame or None
+        self.endgame_time = 0.0
+        if isinstance(monitor, str):
+            from SearchMonitor import SearchMonitor
+            monitor = SearchMonitor(monitor)
+        self.monitor = monitor
+        self.ponderer = None
+        if ponder:
+            if mode not in ('alphabeta', 'mcts'):
+                raise ValueError('Pondering needs the alphabeta or mcts '
+                                 'mode, not {}'.format(mode))
+            from Ponderer import Ponderer
+            self.ponderer = Ponderer(self.searcher)
+
         # Setting the human and AI players pieces
         self.my_marker = random.choice(self.markers)
         if self.my_marker == self.markers[1]:
@@ -34,18 +135,29 @@ class TictacPlayer:
         else:
             self.op_marker = self.markers[1]
 
-        # Create a 3x3 board of InnerBoard objects
-        i = 0
-        while i < 9:
-            self.board.append(InnerBoard(i))
-            i += 1
+        self.attach(GameState(self.markers.index(self.my_marker)))
 
-        self.board = np.array(self.board)
-        self.board = np.reshape(self.board, (3, 3))
+    def attach(self, game):
+        """Uses the given game engine as the board.
 
-        self.condition = InnerBoard(-1)
+        Creates a 3x3 board of InnerBoard views over the engine, so that the
+        AI can play in a game it did not create, such as one run by the
+        Arena.
 
-        self.winner = None
+        Args:
+            game: The GameState to play in.
+        """
+        # Create a 3x3 board of InnerBoard views over a single game engine
+        self.game = game
+        self.board = [[InnerBoard(row * 3 + col, self.game)
+                       for col in range(3)] for row in range(3)]
+
+        self.condition = InnerBoard(-1, self.game)
+
+    @property
+    def winner(self):
+        """Which player has won the larger board, 'T' for a tie, else None."""
+        return self.game.winner
 
     def condition_heuristic(self):
         """ Calculates the heuristic of the conditional board.
@@ -59,22 +171,29 @@ class TictacPlayer:
         """
         return self.condition.inner_heuristic(self.my_marker, self.op_marker)
 
-    def heuristic(self, state=board):
+    def heuristic(self, state=None):
         """Calculates the game heuristic value of the given state.
 
         This function will calculate the game heuristic value of the current 
         state that will later be used in determining the ideal move for the AI
-        player. This calculation will be used when assessing states.
+        player. This calculation will be used when assessing states, which are
+        applied to the board in place with apply_move beforehand.
 
         Args:
-            state: The state to which the heuristic is calculated.
+            state: The state to which the heuristic is calculated, defaults to
+              the current board.
 
         Return:
             The game heuristic value of the specified state.
         """
-        score = 0
-        if self.board_validation(self.my_marker):
+        game = self.game if state is None else state[0][0].engine
+        if game.winner == self.my_marker:
             return float('inf')
+        if state is None:
+            # The board's heuristic is summed from table lookups by the engine
+            return self.game.heuristic(self.markers.index(self.my_marker))
+
+        score = 0
         for row in state:
             for inner in row:
                 score += inner.inner_heuristic(self.my_marker, self.op_marker)
@@ -100,82 +219,92 @@ class TictacPlayer:
         y = num % 3
         return x, y
 
-    def succ(self, targetID, state=board):
-        """A function used to find all successor states of the current state.
+    def succ(self, targetID):
+        """A function used to lazily find all successor moves of the board.
 
         This function will be used to calculate possible moves and assess them 
-        to select the best possible move. Assessment will be conducted by the 
-        heuristic function.
+        to select the best possible move. Rather than copying the board for
+        every successor, moves are yielded so that they may be applied in
+        place with apply_move, assessed by the heuristic function and then
+        reverted with revert_move.
 
         Args:
-            state: The current state to which we are calculating successors
             targetID: The InnerBoard object's ID where the AI must make a move
 
-        Return:
-            A list of the valid successor states with respect to the argument
-            'state'. Note that there are at most 9 successor states because the
-            AI may only place a piece in one of the InnerBoard objects, which
-            only contains 9 possible spaces.
+        Yields:
+            The valid successor moves encoded as inner * 9 + space. Note that
+            there are at most 9 successor moves when the targeted InnerBoard
+            is undecided, because the AI may only place a piece in one of its
+            9 spaces.
         """
-        successors = []
+        if self.game.winner is not None:
+            return
 
         # Calculate the row and column of the InnerBoard where the AI must move
         # based on it's targetID
-        if int(targetID) == -1:
-            pass
-        else:
+        if int(targetID) != -1:
             x, y = self.calculate_pos(targetID)
-            if not state[x][y].validate():
-                return self.inner_succ(x, y)
+            if not self.board[x][y].validate():
+                yield from self.inner_succ(x, y)
+                return
 
         x, y, index = 0, 0, 0
         while index < 9:
             x, y = self.calculate_pos(index)
             index += 1
-            if state[x][y].validate():
-
+            if self.board[x][y].validate():
                 continue
-            successors += self.inner_succ(x, y)
-
-        return successors
+            yield from self.inner_succ(x, y)
 
     def inner_succ(self, x, y):
         """A helper function for the successor function.
 
-        This function serves to calculate successors of the current state with
-        the specified InnerBoard.
+        This function serves to lazily calculate successor moves of the
+        current state within the specified InnerBoard.
 
         Args:
             x: The row of the target InnerBoard.
             y: the column of the specified InnerBoard.
 
-        Return:
-            A list of possible successor states within the InnerBoard. Note
-            that 9 is the maximum amount of successor states that a single
+        Yields:
+            The encoded moves to each empty space of the InnerBoard. Note
+            that 9 is the maximum amount of successors that a single
             InnerBoard may contain.
         """
-        successors = []
-        index = 0
-        for i in self.board[x][y].state:
-            for j in i:
-                if str(j) not in self.markers:
-                    curr = copy.deepcopy(self.board)
-                    row = index // 3
-                    col = index % 3
-                    curr[x][y].place_marker(self.my_marker, row, col)
-                    successors.append((curr, index))
-                index += 1
-        return successors
+        inner = x * 3 + y
+        cells = self.game.cells
+        for space in BITS[FULL & ~(cells[0][inner] | cells[1][inner])]:
+            yield inner * 9 + space
+
+    def apply_move(self, move, marker=None):
+        """Applies an encoded move to the board in place.
+
+        Args:
+            move: The move encoded as inner * 9 + space.
+            marker: The marker to place, defaults to the AI's marker.
+        """
+        if marker is None:
+            marker = self.my_marker
+        self.game.place(self.markers.index(marker), move // 9, move % 9)
 
+    def revert_move(self):
+        """Reverts the most recent move applied with apply_move."""
+        self.game.undo()
 
     def first_turn(self):
         """ Helper function for take_turn to randomly select the first turn.
 
-        This function will randomly select a first move for the AI player. 
+        This function will randomly select a first move for the AI player,
+        unless the opening book has a move for the empty board.
 
         Return:
             The innerboard index that the human player must move to.
         """
+        move = self.book_move(-1)
+        if move is not None:
+            self.apply_move(move)
+            return move % 9
+
         inner = random.choice(range(9))
         space = random.choice(range(9))
 
@@ -183,27 +312,120 @@ class TictacPlayer:
         row, col = self.calculate_pos(space)
 
         self.board[x][y].place_marker(self.my_marker, row, col)
-        print('I have decided to move to {}{}'.format(inner, space))
         return space
 
-    def update(self, new):
-        """ Helper function for take_turn to update the board state.
+    def greedy_move(self, inner):
+        """Selects the successor move with the best heuristic one ply ahead.
+
+        Args:
+            inner: The specified InnerBoard where the AI player must move.
+
+        Return:
+            The encoded move with the highest heuristic.
+        """
+        top = float('-inf')
+        best_move = None
+
+        # Iterate over successors to find the best heuristic
+        for move in self.succ(inner):
+            self.apply_move(move)
+            temp = self.heuristic()
+            self.revert_move()
+            if temp > top:
+                top = temp
+                best_move = move
+        return best_move
+
+    def search_move(self, inner):
+        """Selects a move with the configured search engine.
+
+        The time the endgame solver spent on this move without solving it
+        is taken from the search's time_limit.
+
+        Args:
+            inner: The specified InnerBoard where the AI player must move.
+
+        Return:
+            The encoded move chosen by the search.
+        """
+        self.game.set_turn(self.markers.index(self.my_marker), int(inner))
+        searcher = self.searcher
+        time_limit = searcher.time_limit
+        if time_limit is not None and self.endgame_time:
+            searcher.time_limit = max(0.0, time_limit - self.endgame_time)
+        try:
+            return searcher.search(self.game)
+        finally:
+            searcher.time_limit = time_limit
+
+    def book_move(self, inner):
+        """Looks up the current position in the opening book.
+
+        Args:
+            inner: The specified InnerBoard where the AI player must move.
+
+        Return:
+            The encoded book move, or None if there is no book or the
+            position is not in it.
+        """
+        if self.book is None:
+            return None
+        self.game.set_turn(self.markers.index(self.my_marker), int(inner))
+        return self.book.move_for(self.game)
+
+    def endgame_move(self, inner):
+        """Solves the current position exactly if it is small enough.
+
+        Args:
+            inner: The specified InnerBoard where the AI player must move.
+
+        Return:
+            The encoded perfect move, or None if there is no solver, the
+            position is too large or the solver ran out of budget.
+        """
+        if self.endgame is None:
+            return None
+        self.game.set_turn(self.markers.index(self.my_marker), int(inner))
+        if not self.endgame.applies(self.game):
+            return None
+        start = time.perf_counter()
+        move = self.endgame.search(self.game)
+        if move is None:
+            self.endgame_time = time.perf_counter() - start
+        return move
+
+    def ponder(self):
+        """Starts searching on the opponent's time, if pondering is on.
+
+        Call this once the AI's move has been played; pondering continues
+        in the background until the AI's next choose_move.
+        """
+        if self.ponderer is not None:
+            self.ponderer.start(self.game)
 
-        This function will update the current board's state to reflect the move 
-        selected by the AI player.
+    def ponder_move(self, inner):
+        """Stops pondering and returns its move if it already has one.
 
         Args:
-            new: The new state that contains the AI player's move.
+            inner: The specified InnerBoard where the AI player must move.
+
+        Return:
+            The encoded move found while pondering if the opponent played
+            the predicted reply and the search of the resulting position
+            completed, otherwise None.
         """
-        for x in range(3):
-            for y in range(3):
-                self.board[x][y].set_state(new[x][y].state)
+        if self.ponderer is None:
+            return None
+        self.game.set_turn(self.markers.index(self.my_marker), int(inner))
+        return self.ponderer.finish(self.game)
 
     def take_turn(self, inner):
         """Executes the AI's next calculated move.
 
         In order to take its turn, the AI player will use this function to 
         compare game theoretic values for each state using its heuristic and determine which move is optimal.
+        Each successor is applied in place, scored and reverted, so no board
+        is copied while searching. The move is selected according to mode.
 
         Args:
             inner: The specified InnerBoard where the AI player must move.
@@ -211,46 +433,62 @@ class TictacPlayer:
         Return:
             The InnerBoard to which the human player must move.
         """
-        top = -1
-        best_state = None
-        print('Assessing possible moves...')
+        best_move = self.choose_move(inner)
+        self.apply_move(best_move)
+        return best_move % 9
 
-        # Iterate over successors to find the best heuristic
-        for state in self.succ(inner, self.board):
-            temp = self.heuristic(state[0])
-            if temp > top:
-                top = temp
-                best_state = state
+    def choose_move(self, inner):
+        """Selects the AI's next move according to mode without playing it.
 
-        print('I have decided to move to {}{}'.format(inner, best_state[1]))
-        self.update(best_state[0])
-        return best_state[1]
+        Pondering is stopped first, and its move used if it has one. Each
+        phase of the decision is timed by the monitor, if there is one.
 
+        Args:
+            inner: The specified InnerBoard where the AI player must move.
 
-    def board_validation(self, piece):
+        Return:
+            The selected move encoded as inner * 9 + space.
+        """
+        monitor = self.monitor
+        run = _run_phase
+        if monitor is not None:
+            self.game.set_turn(self.markers.index(self.my_marker),
+                               int(inner))
+            monitor.start_move(self.game)
+            run = monitor.phase
+
+        move = None
+        self.endgame_time = 0.0
+        if self.ponderer is not None:
+            move = run('ponder', self.ponder_move, inner)
+        if move is None and self.book is not None:
+            move = run('book', self.book_move, inner)
+        if move is None and self.endgame is not None:
+            move = run('endgame', self.endgame_move, inner)
+        if move is None:
+            if self.mode != 'greedy':
+                move = run('search', self.search_move, inner)
+            else:
+                move = run('greedy', self.greedy_move, inner)
+        if monitor is not None:
+            monitor.finish_move(self, move)
+        return move
+
+
+    def board_validation(self):
         """Checks to see if the current configuration is terminal.
 
-        This function checks the state of the condition attribute and validates 
-        it. Since condition is represented by an InnerBoard object, the 
-        validate function may be utilized.
+        The game engine keeps every InnerBoard's result, the condition board
+        and the overall winner up to date as markers are placed, so this is a
+        constant time query with no side effects. Announcing results is left
+        to the ConsoleView used by start_game.
 
         Return:
             True if the board is in a terminal state, otherwise false.
         """
-        index = 0
-        for row in self.board:
-            for inner in row:
-                if (inner.winner == None) and inner.validate():
-                    print('Congratulations! {} has won inner board #{}'.format(
-                        piece, index))
-                    x, y = self.calculate_pos(index)
-                    self.condition.state[x][y] = piece
-                index += 1
-        if self.condition.validate():
-            self.winner = piece
-            print("Congratulations to {}! You've won the game!".format(piece))
-
-    def print_state(self, state=board):
+        return self.game.winner is not None
+
+    def print_state(self, state=None):
         """Prints the current game state to the console.
 
         This function visualizes the board state and prints it to the console
@@ -259,15 +497,18 @@ class TictacPlayer:
         Args:
             state: specifies which state to print, defaults to current state.
         """
-        state = np.reshape(state, (3, 3))
+        import numpy as np
+        if state is None:
+            state = self.board
+        state = np.reshape(np.array(state, dtype=object), (3, 3))
         for row in state:
             top, mid, bot = [], [], []
             for inner in row:
                 # Format the output for printing to command line
                 inner = inner.print_inner(verbose=False)
-                top.append(list(inner[0]))
-                mid.append(list(inner[1]))
-                bot.append(list(inner[2]))
+                top.append(inner[0].tolist())
+                mid.append(inner[1].tolist())
+                bot.append(inner[2].tolist())
             print(top, mid, bot, sep='\n')
             print()
 
@@ -353,38 +594,70 @@ class TictacPlayer:
         The application will begin by randomly selecting which player goes
         first, and alternating turns from then onward.
         """
+        from ConsoleView import ConsoleView
         player = random.choice([0, 1])
         inner = -1
+        view = ConsoleView()
 
         # Print which palayer will move first
+        view.announce_first(player == 0)
         if player == 0:
-            print('The AI goes first!')
             inner = self.first_turn()
+            view.announce_move(self.game)
+            self.ponder()
             player = 1
-        else:
-            print('You go first!')
         
         # Facilitates alternating turns between human and AI players
         while self.winner == None:
             if player == 0:
+                view.announce_thinking()
                 inner = self.take_turn(inner)
+                view.announce_move(self.game)
+                if self.mode == 'mcts':
+                    view.announce_playouts(self.searcher)
+                self.ponder()
                 player = 1
-                self.board_validation(self.my_marker)
             elif player == 1:
                 inner = self.op_move(inner)
                 player = 0
-                self.board_validation(self.op_marker)
+            view.announce_results(self.game)
+
 
+def _run_phase(name, function, *args):
+    """Runs one phase of choose_move when there is no monitor to time it."""
+    return function(*args)
 
-def main():
+
+def main(argv=None):
     """The main method for running the program.
 
     This method facilitates creating the TictacPlayer object and starting the 
     game.
     """
-
-    ttp = TictacPlayer()
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Play Ultimate Tic-Tac-Toe against the AI.')
+    parser.add_argument('-m', '--mode', choices=TictacPlayer.MODES,
+                        default='greedy')
+    parser.add_argument('--time-limit', type=float, default=1.0,
+                        help='seconds per move for searching modes')
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--book', help='opening book file')
+    parser.add_argument('--endgame', action='store_true',
+                        help='solve endgames exactly')
+    parser.add_argument('--ponder', action='store_true',
+                        help='search while you think')
+    parser.add_argument('--metrics', help='JSON lines file for per move '
+                        'search metrics')
+    parser.add_argument('--weights', help='evaluation weights file')
+    args = parser.parse_args(argv)
+
+    ttp = TictacPlayer(args.mode, time_limit=args.time_limit,
+                       max_depth=args.depth, book=args.book,
+                       endgame=args.endgame, monitor=args.metrics,
+                       ponder=args.ponder, weights=args.weights)
     ttp.start_game()
 
 
-main()
+if __name__ == '__main__':
+    main()
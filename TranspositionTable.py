@@ -0,0 +1,135 @@
+from array import array
+
+# Bound types describing how a stored score relates to the true score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class TranspositionTable:
+    """A fixed-memory cache of search results keyed by Zobrist hash.
+
+    The table is a power of two number of buckets, each holding two entries
+    in flat typed arrays so that its memory use never grows. The first entry
+    of a bucket is depth-preferred: it is only replaced by a search at least
+    as deep. Any other result goes to the second entry, which is always
+    replaced, so recent shallow results are kept too.
+
+    Attributes:
+        size: The number of buckets in the table.
+        keys: The full 64-bit hash of the position held in each entry.
+        depths: The search depth of each entry, -1 if the entry is empty.
+        flags: The bound type (EXACT, LOWER or UPPER) of each entry.
+        scores: The score of each entry.
+        moves: The best encoded move of each entry, -1 if there is none.
+        probes: The number of lookups performed.
+        hits: The number of lookups that found the position.
+        misses: The number of lookups that did not find the position.
+        collisions: The number of lookups that missed while the bucket held
+          other positions whose hash mapped to the same index.
+        stores: The number of entries written.
+        overwrites: The number of writes that evicted a different position.
+    """
+
+    def __init__(self, size=1 << 16):
+        """Allocates the table with the given number of buckets.
+
+        Args:
+            size: The number of buckets, rounded up to a power of two.
+        """
+        buckets = 1
+        while buckets < size:
+            buckets <<= 1
+        self.size = buckets
+        self.mask = buckets - 1
+        self.keys = array('Q', [0]) * (2 * buckets)
+        self.depths = array('b', [-1]) * (2 * buckets)
+        self.flags = array('b', [EXACT]) * (2 * buckets)
+        self.scores = array('q', [0]) * (2 * buckets)
+        self.moves = array('b', [-1]) * (2 * buckets)
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Resets the hit/miss/collision counters."""
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        """Empties every entry of the table and resets the counters."""
+        # Assigned in place, so arrays cached by a search stay valid
+        self.depths[:] = array('b', [-1]) * (2 * self.size)
+        self.reset_stats()
+
+    def memory(self):
+        """Returns the number of bytes used by the entry arrays."""
+        return sum(len(a) * a.itemsize for a in
+                   (self.keys, self.depths, self.flags, self.scores,
+                    self.moves))
+
+    def probe(self, key):
+        """Looks up a position.
+
+        Args:
+            key: The Zobrist hash of the position.
+
+        Return:
+            A tuple of (depth, flag, score, move) if the position is stored,
+            otherwise None.
+        """
+        self.probes += 1
+        slot = (key & self.mask) << 1
+        depths = self.depths
+        for i in (slot, slot + 1):
+            if depths[i] >= 0 and self.keys[i] == key:
+                self.hits += 1
+                return depths[i], self.flags[i], self.scores[i], self.moves[i]
+        self.misses += 1
+        if depths[slot] >= 0 or depths[slot + 1] >= 0:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        """Records a search result, replacing an entry if necessary.
+
+        Args:
+            key: The Zobrist hash of the position.
+            depth: The depth the position was searched to.
+            flag: The bound type of the score.
+            score: The score of the position.
+            move: The best encoded move, -1 if there is none.
+        """
+        self.stores += 1
+        slot = (key & self.mask) << 1
+        depths = self.depths
+        keys = self.keys
+        if depth >= depths[slot]:
+            i = slot
+        else:
+            i = slot + 1
+        if depths[i] >= 0 and keys[i] != key:
+            self.overwrites += 1
+        keys[i] = key
+        depths[i] = depth
+        self.flags[i] = flag
+        self.scores[i] = score
+        self.moves[i] = move
+
+    def stats(self):
+        """Returns the table's size and counters as a dictionary."""
+        used = sum(1 for depth in self.depths if depth >= 0)
+        return {
+            'buckets': self.size,
+            'bytes': self.memory(),
+            'used': used,
+            'probes': self.probes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+        }
@@ -0,0 +1,519 @@
+import argparse
+import collections
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from GameState import *
+from Evaluation import *
+from Search import AlphaBetaSearch
+from TranspositionTable import TranspositionTable
+
+# The change of each weight that SPSA perturbs by and Texel tuning tries.
+# The tuners work in units of these steps so that weights of very different
+# magnitudes move alike.
+STEPS = Weights(one=2, two=10, three=50, condition=0.25, center=0.1,
+                corner=0.1, edge=0.1, freedom=10)
+
+# The weights tuned by default. Scaling every line score and board weight
+# together does not change which move is best, so the edge weight is held
+# at 1 as the unit of the others.
+TUNED = ('one', 'two', 'three', 'condition', 'center', 'corner', 'freedom')
+
+# Buckets of the TranspositionTable of each self-play game
+TABLE_SIZE = 1 << 12
+
+# Searches created in this process, keyed by weights and depth
+_searches = {}
+
+# The samples of the Texel worker processes, set up by _init_samples
+_samples = None
+
+Sample = collections.namedtuple(
+    'Sample', ['indices', 'meta', 'player', 'target', 'result'])
+Sample.__doc__ = """A position labelled with the result of its game.
+
+Holds just the fields of a GameState that Evaluator.evaluate reads, so a
+sample can be evaluated in its place.
+
+Attributes:
+    indices: The configuration index of every InnerBoard.
+    meta: The masks of the InnerBoards won by 'X' and by 'O'.
+    player: Index into MARKERS of the player to move.
+    target: The target InnerBoard, -1 for any.
+    result: 1 if 'X' won the game, 0 if 'O' won and 0.5 for a tie.
+"""
+
+# The result of a game for 'X', by status code
+RESULTS = {X_WON: 1.0, O_WON: 0.0, TIED: 0.5}
+
+
+def _search(weights, depth):
+    """Returns this process's fixed depth search with the weights.
+
+    Each call starts a fresh TranspositionTable so games stay independent.
+    """
+    key = (tuple(weights), depth)
+    search = _searches.get(key)
+    if search is None:
+        if len(_searches) >= 16:
+            _searches.clear()
+        search = AlphaBetaSearch(depth, time_limit=None, table=False,
+                                 weights=weights)
+        _searches[key] = search
+    search.table = TranspositionTable(TABLE_SIZE)
+    return search
+
+
+def random_opening(plies, seed):
+    """Plays uniformly random moves from the empty board.
+
+    Return:
+        The list of encoded moves played.
+    """
+    rand = random.Random(seed).random
+    game = GameState()
+    moves = []
+    while len(moves) < plies and game.winner is None:
+        move = game.random_move(rand)
+        game.make_move(move)
+        moves.append(move)
+    return moves
+
+
+def play_game(weights_x, weights_o, depth, opening=()):
+    """Plays one game between two fixed depth searches.
+
+    Args:
+        weights_x: The Weights of the search playing 'X'.
+        weights_o: The Weights of the search playing 'O'.
+        depth: The depth both sides search every move to.
+        opening: Encoded moves to play before the searches take over.
+
+    Return:
+        A tuple of the moves played, opening included, and the game's
+        status code.
+    """
+    game = GameState()
+    for move in opening:
+        game.make_move(move)
+    searches = (_search(weights_x, depth), _search(weights_o, depth))
+    while game.winner is None:
+        game.make_move(searches[game.player].search(game))
+    moves = [entry[1] * 9 + entry[2] for entry in game.history]
+    return moves, STATUS_WINNER.index(game.winner)
+
+
+def play_pair(plus, minus, depth, seed, opening_plies):
+    """Plays two games from one random opening, each side playing 'X' once.
+
+    Return:
+        The total score of plus, from 0 to 2 counting a tie as half.
+    """
+    opening = random_opening(opening_plies, seed)
+    moves, status = play_game(plus, minus, depth, opening)
+    score = RESULTS[status]
+    moves, status = play_game(minus, plus, depth, opening)
+    return score + 1.0 - RESULTS[status]
+
+
+class SelfPlayTuner:
+    """Tunes Weights with SPSA over fast self-play games.
+
+    Every iteration perturbs each tuned weight by c_k steps up or down at
+    random, plays pairs of games between the two perturbed weight sets
+    from random openings across worker processes, and moves the weights
+    towards the winning set by a_k steps times the score difference.
+    Every game is a fixed depth search on both sides, so the tuned weights
+    are stronger at that same search budget. The gains decay as in
+    Spall's SPSA.
+
+    Attributes:
+        weights: The current Weights.
+        tuned: The names of the weights being tuned.
+        depth: The search depth of every self-play move.
+        pairs: The pairs of games played per iteration.
+        opening_plies: The random moves opening each pair.
+        workers: The number of worker processes, None for one per CPU and
+          1 to play every game in this process.
+        a: The initial update gain, in steps.
+        c: The initial perturbation, in steps.
+        stability: Spall's A, which slows the early updates.
+        iteration: The number of iterations run.
+        games: The number of games played.
+    """
+
+    def __init__(self, weights=DEFAULT_WEIGHTS, tuned=TUNED, depth=2,
+                 pairs=16, opening_plies=4, workers=None, a=10.0, c=2.0,
+                 stability=10, seed=0):
+        """Initializes the tuner.
+
+        Raises:
+            ValueError: A tuned name is not a weight.
+        """
+        for name in tuned:
+            if name not in Weights._fields:
+                raise ValueError('Unknown weight {}, expected one of {}'
+                                 .format(name, Weights._fields))
+        self.weights = Weights(*weights)
+        self.tuned = tuple(tuned)
+        self.depth = depth
+        self.pairs = pairs
+        self.opening_plies = opening_plies
+        self.workers = workers
+        self.a = a
+        self.c = c
+        self.stability = stability
+        self.rand = random.Random(seed)
+        self.seed = seed
+        self.iteration = 0
+        self.games = 0
+
+    def _perturbed(self, signs, c_k):
+        """Returns the weights moved by c_k steps in the signs' directions."""
+        return self.weights._replace(**{
+            name: getattr(self.weights, name)
+            + sign * c_k * getattr(STEPS, name)
+            for name, sign in zip(self.tuned, signs)})
+
+    def step(self, executor=None):
+        """Runs one iteration.
+
+        Args:
+            executor: The pool to play the games in, None to play them in
+              this process.
+
+        Return:
+            The score of the weights perturbed along the random signs
+            against those perturbed the opposite way, from 0 to 1.
+        """
+        k = self.iteration
+        a_k = self.a / (k + 1 + self.stability) ** 0.602
+        c_k = self.c / (k + 1) ** 0.101
+        signs = [self.rand.choice((-1, 1)) for name in self.tuned]
+        plus = self._perturbed(signs, c_k)
+        minus = self._perturbed([-sign for sign in signs], c_k)
+
+        seeds = [self.seed + k * self.pairs + pair
+                 for pair in range(self.pairs)]
+        arguments = ([plus] * self.pairs, [minus] * self.pairs,
+                     [self.depth] * self.pairs, seeds,
+                     [self.opening_plies] * self.pairs)
+        if executor is None:
+            scores = list(map(play_pair, *arguments))
+        else:
+            scores = list(executor.map(play_pair, *arguments))
+        score = sum(scores) / (2 * self.pairs)
+
+        # The gradient estimate in steps, from the score difference of plus
+        # over minus, 2 * score - 1
+        gradient = (2 * score - 1) / (2 * c_k)
+        updated = {}
+        for name, sign in zip(self.tuned, signs):
+            value = (getattr(self.weights, name)
+                     + a_k * gradient * sign * getattr(STEPS, name))
+            updated[name] = value if name == 'freedom' else max(0.0, value)
+        self.weights = self.weights._replace(**updated)
+        self.iteration += 1
+        self.games += 2 * self.pairs
+        return score
+
+    def run(self, iterations, callback=None):
+        """Runs iterations, calling callback(tuner, score) after each.
+
+        Return:
+            The tuned Weights.
+        """
+        if self.workers == 1:
+            for iteration in range(iterations):
+                score = self.step()
+                if callback is not None:
+                    callback(self, score)
+            return self.weights
+        with ProcessPoolExecutor(self.workers) as executor:
+            for iteration in range(iterations):
+                score = self.step(executor)
+                if callback is not None:
+                    callback(self, score)
+        return self.weights
+
+
+def load_samples(paths, skip=4, limit=None):
+    """Reads labelled positions from game record files.
+
+    Every position of every finished game is labelled with the game's
+    result, except the first skip plies, which are mostly opening noise.
+
+    Args:
+        paths: Game record files written by a GameRecordWriter.
+        skip: The plies at the start of each game to leave out.
+        limit: The most samples to read, None for all.
+
+    Return:
+        A list of Samples.
+    """
+    from GameRecord import read_records, replay
+    samples = []
+    for path in paths:
+        for record in read_records(path):
+            if record.result == UNDECIDED:
+                continue
+            result = RESULTS[record.result]
+            for ply, game in enumerate(replay(record), 1):
+                if ply <= skip or game.winner is not None:
+                    continue
+                samples.append(Sample(tuple(game.indices), tuple(game.meta),
+                                      game.player, game.target, result))
+                if limit is not None and len(samples) >= limit:
+                    return samples
+    return samples
+
+
+def squared_error(weights, samples, scale):
+    """Sums the squared errors of the predicted results of samples.
+
+    The predicted result for 'X' is the logistic of the evaluation for 'X'
+    divided by scale.
+    """
+    evaluate = Evaluator(weights).evaluate
+    error = 0.0
+    for sample in samples:
+        score = evaluate(sample)
+        if sample.player:
+            score = -score
+        predicted = 1.0 / (1.0 + math.exp(max(-500.0, -score / scale)))
+        error += (sample.result - predicted) ** 2
+    return error
+
+
+def _init_samples(samples):
+    """Keeps the Texel samples in a worker process."""
+    global _samples
+    _samples = samples
+
+
+def _partial_error(weights, scale, part, parts):
+    """Sums the squared errors of this worker's share of the samples."""
+    return squared_error(weights, _samples[part::parts], scale)
+
+
+class TexelTuner:
+    """Tunes Weights by fitting the evaluation to the results of games.
+
+    Texel's method: the logistic of the static evaluation of each saved
+    position, divided by scale, predicts the result of its game, and the
+    weights are adjusted one step at a time while the mean squared error
+    of the predictions falls. The samples are split across worker
+    processes, each of which holds a copy of them.
+
+    Attributes:
+        samples: The labelled positions.
+        weights: The current Weights.
+        tuned: The names of the weights being tuned.
+        scale: The evaluation difference that makes a win e times as
+          likely as a loss, see fit_scale.
+        workers: The number of worker processes, None for one per CPU and
+          1 to evaluate every sample in this process.
+        error: The mean squared error of the current weights.
+    """
+
+    def __init__(self, samples, weights=DEFAULT_WEIGHTS, tuned=TUNED,
+                 scale=400.0, workers=None):
+        """Initializes the tuner.
+
+        Raises:
+            ValueError: There are no samples.
+        """
+        if not samples:
+            raise ValueError('Texel tuning needs labelled positions')
+        self.samples = samples
+        self.weights = Weights(*weights)
+        self.tuned = tuple(tuned)
+        self.scale = scale
+        self.workers = workers
+        self.error = None
+        self.executor = None
+
+    def __enter__(self):
+        if self.workers != 1:
+            self.executor = ProcessPoolExecutor(
+                self.workers, initializer=_init_samples,
+                initargs=(self.samples,))
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def mean_error(self, weights, scale=None):
+        """Returns the mean squared error of the weights' predictions."""
+        scale = scale or self.scale
+        if self.executor is None:
+            total = squared_error(weights, self.samples, scale)
+        else:
+            parts = self.workers or os.cpu_count() or 1
+            total = sum(self.executor.map(
+                _partial_error, [weights] * parts, [scale] * parts,
+                range(parts), [parts] * parts))
+        return total / len(self.samples)
+
+    def fit_scale(self, low=10.0, high=10000.0, rounds=24):
+        """Finds the scale minimizing the error of the current weights.
+
+        A ternary search over the logarithm of the scale.
+
+        Return:
+            The fitted scale, also kept in scale.
+        """
+        low, high = math.log(low), math.log(high)
+        for round_ in range(rounds):
+            left = low + (high - low) / 3
+            right = high - (high - low) / 3
+            if (self.mean_error(self.weights, math.exp(left))
+                    < self.mean_error(self.weights, math.exp(right))):
+                high = right
+            else:
+                low = left
+        self.scale = math.exp((low + high) / 2)
+        self.error = None
+        return self.scale
+
+    def run(self, passes=10, callback=None):
+        """Adjusts the weights until a pass improves none of them.
+
+        Each pass tries moving every tuned weight one step up, then one
+        step down, keeping any move that lowers the error. callback(tuner)
+        is called after each pass.
+
+        Return:
+            The tuned Weights.
+        """
+        if self.error is None:
+            self.error = self.mean_error(self.weights)
+        for pass_ in range(passes):
+            improved = False
+            for name in self.tuned:
+                step = getattr(STEPS, name)
+                for change in (step, -step):
+                    value = getattr(self.weights, name) + change
+                    if value < 0 and name != 'freedom':
+                        continue
+                    candidate = self.weights._replace(**{name: value})
+                    error = self.mean_error(candidate)
+                    if error < self.error:
+                        self.weights, self.error = candidate, error
+                        improved = True
+                        break
+            if callback is not None:
+                callback(self)
+            if not improved:
+                break
+        return self.weights
+
+
+def generate_games(path, count, weights=DEFAULT_WEIGHTS, depth=2,
+                   opening_plies=8, workers=None, seed=0):
+    """Plays self-play games and writes them to a game record file.
+
+    Return:
+        The number of games written.
+    """
+    from GameRecord import GameRecordWriter
+    openings = [random_opening(opening_plies, seed + index)
+                for index in range(count)]
+    arguments = ([weights] * count, [weights] * count, [depth] * count,
+                 openings)
+    with GameRecordWriter(path) as writer:
+        if workers == 1:
+            for moves, status in map(play_game, *arguments):
+                writer.write(moves, status)
+            return writer.count
+        with ProcessPoolExecutor(workers) as executor:
+            for moves, status in executor.map(play_game, *arguments,
+                                              chunksize=8):
+                writer.write(moves, status)
+        return writer.count
+
+
+def format_weights(weights):
+    """Formats Weights as name=value pairs."""
+    return ' '.join('{}={:g}'.format(name, round(value, 3))
+                    for name, value in Weights(*weights)._asdict().items())
+
+
+def main(argv=None):
+    """Generates self-play games or tunes the weights from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Tune the evaluation weights.')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker processes, default one per CPU')
+    parser.add_argument('--weights', help='weights file to start from')
+    parser.add_argument('--tune', default=','.join(TUNED),
+                        help='comma separated weights to tune')
+    parser.add_argument('--seed', type=int, default=0)
+    commands = parser.add_subparsers(dest='command', required=True)
+    games = commands.add_parser('games', help='write self-play games to a '
+                                'game record file')
+    games.add_argument('out')
+    games.add_argument('-n', '--games', type=int, default=1000)
+    games.add_argument('--depth', type=int, default=2)
+    games.add_argument('--opening', type=int, default=8,
+                       help='random plies opening each game')
+    spsa = commands.add_parser('spsa', help='tune with SPSA over self-play')
+    spsa.add_argument('-o', '--out', help='weights file to write')
+    spsa.add_argument('-n', '--iterations', type=int, default=100)
+    spsa.add_argument('--pairs', type=int, default=16,
+                      help='pairs of games per iteration')
+    spsa.add_argument('--depth', type=int, default=2)
+    spsa.add_argument('--opening', type=int, default=4,
+                      help='random plies opening each pair')
+    texel = commands.add_parser('texel', help='fit to the results of saved '
+                                'games')
+    texel.add_argument('records', nargs='+', help='game record files')
+    texel.add_argument('-o', '--out', help='weights file to write')
+    texel.add_argument('--passes', type=int, default=10)
+    texel.add_argument('--limit', type=int, default=None,
+                       help='most positions to read')
+    args = parser.parse_args(argv)
+
+    weights = load_weights(args.weights) if args.weights else DEFAULT_WEIGHTS
+    tuned = [name for name in args.tune.split(',') if name]
+    start = time.perf_counter()
+
+    if args.command == 'games':
+        count = generate_games(args.out, args.games, weights, args.depth,
+                               args.opening, args.workers, args.seed)
+        print('{} games written to {} in {:.1f}s'.format(
+            count, args.out, time.perf_counter() - start))
+        return
+
+    if args.command == 'spsa':
+        def report(tuner, score):
+            print('iteration {} score {:.3f} games {} ({:.1f}/sec) {}'.format(
+                tuner.iteration, score, tuner.games,
+                tuner.games / (time.perf_counter() - start),
+                format_weights(tuner.weights)))
+
+        tuner = SelfPlayTuner(weights, tuned, args.depth, args.pairs,
+                              args.opening, args.workers, seed=args.seed)
+        weights = tuner.run(args.iterations, report)
+    else:
+        samples = load_samples(args.records, limit=args.limit)
+        print('{} positions'.format(len(samples)))
+
+        def report(tuner):
+            print('error {:.6f} {}'.format(tuner.error,
+                                           format_weights(tuner.weights)))
+
+        with TexelTuner(samples, weights, tuned,
+                        workers=args.workers) as tuner:
+            print('scale {:.1f}'.format(tuner.fit_scale()))
+            weights = tuner.run(args.passes, report)
+    if args.out:
+        save_weights(args.out, weights)
+
+
+if __name__ == '__main__':
+    main()
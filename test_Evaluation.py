@@ -0,0 +1,43 @@
+"""The Evaluator with DEFAULT_WEIGHTS must reproduce GameState.heuristic."""
+import random
+from GameState import GameState
+from Evaluation import DEFAULT_WEIGHTS, Evaluator
+from Search import AlphaBetaSearch
+
+
+def random_games(count, seed):
+    """Yields every position of count random games, terminal ones included."""
+    rand = random.Random(seed)
+    for index in range(count):
+        game = GameState(rand.randrange(2))
+        yield game
+        while game.winner is None:
+            game.make_move(game.random_move(rand.random))
+            yield game
+
+
+def test_default_weights_match_heuristic():
+    evaluator = Evaluator(DEFAULT_WEIGHTS)
+    positions = 0
+    for game in random_games(300, 21):
+        player = game.player
+        assert evaluator.evaluate(game) == (game.heuristic(player)
+                                            - game.heuristic(1 - player))
+        positions += 1
+    assert positions > 15000
+
+
+def test_default_weights_search_unchanged():
+    plain = AlphaBetaSearch(3, time_limit=None, table=False)
+    weighted = AlphaBetaSearch(3, time_limit=None, table=False,
+                               weights=DEFAULT_WEIGHTS)
+    rand = random.Random(4)
+    for index in range(20):
+        game = GameState()
+        for ply in range(rand.randrange(40)):
+            game.make_move(game.random_move(rand.random))
+            if game.winner is not None:
+                break
+        if game.winner is None:
+            assert (plain.search(game), plain.score) == (
+                weighted.search(game), weighted.score)
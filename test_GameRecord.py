@@ -0,0 +1,72 @@
+"""Round trips of positions and games through GameRecord's formats."""
+import random
+from GameState import GameState
+from GameRecord import (POSITION_SIZE, GameRecordWriter, from_notation,
+                        game_status, pack_position, read_positions,
+                        read_records, replay, to_notation, unpack_position,
+                        write_positions)
+
+
+def random_games(count, seed):
+    """Returns count finished random games, each with its history."""
+    rand = random.Random(seed)
+    games = []
+    for index in range(count):
+        game = GameState(rand.randrange(2))
+        while game.winner is None:
+            game.make_move(game.random_move(rand.random))
+        games.append(game)
+    return games
+
+
+def positions(game):
+    """Yields a copy of every position of a game, the final one included."""
+    replayed = GameState(game.history[0][0])
+    yield replayed.copy()
+    for entry in game.history:
+        replayed.make_move(entry[1] * 9 + entry[2])
+        yield replayed.copy()
+
+
+def assert_same_position(game, restored):
+    assert restored.encode() == game.encode()
+    assert restored.winner == game.winner
+    assert restored.decided == game.decided
+    assert restored.meta == game.meta
+    assert restored.hash == game.hash
+    assert restored.scores == game.scores
+
+
+def test_pack_and_notation_round_trip():
+    for game in random_games(50, 16):
+        for position in positions(game):
+            packed = pack_position(position)
+            assert len(packed) == POSITION_SIZE
+            assert_same_position(position, unpack_position(packed))
+            text = to_notation(position)
+            assert_same_position(position, from_notation(text))
+            assert to_notation(from_notation(text)) == text
+
+
+def test_position_and_record_files_round_trip(tmp_path):
+    games = random_games(20, 3)
+    stored = [position for game in games for position in positions(game)]
+    path = str(tmp_path / 'positions.bin')
+    assert write_positions(path, stored) == len(stored)
+    packed = list(read_positions(path, chunk=7))
+    assert len(packed) == len(stored)
+    for position, data in zip(stored, packed):
+        assert_same_position(position, unpack_position(data))
+
+    path = str(tmp_path / 'games.bin')
+    writer = GameRecordWriter(path)
+    for game in games:
+        writer.write_game(game)
+    writer.close()
+    records = list(read_records(path))
+    assert len(records) == len(games)
+    for game, record in zip(games, records):
+        assert record.result == game_status(game)
+        for final in replay(record):
+            pass
+        assert_same_position(game, final)
@@ -0,0 +1,165 @@
+"""Regression tests of the bitboard GameState against list-based rules.
+
+ListGame re-implements the original list-of-markers engine (InnerBoard's
+validate and inner_heuristic, TictacPlayer's succ and board_validation)
+without any tables, and random games check that GameState agrees with it
+on every position.
+"""
+import random
+from GameState import GameState, LINES, MARKERS, EMPTY, TIE
+from Benchmark import perft
+
+# Leaf counts of the legal move tree from the empty board
+PERFT = {1: 81, 2: 720, 3: 6336, 4: 55080}
+
+
+class ListGame:
+    """The original rules over nine lists of nine markers."""
+
+    def __init__(self):
+        self.boards = [[EMPTY] * 9 for inner in range(9)]
+        self.winners = [None] * 9
+        self.player = 0
+        self.target = -1
+        self.winner = None
+
+    @staticmethod
+    def validate(board):
+        """Returns the winner of a 3x3 board, 'T' when full, else None."""
+        for a, b, c in LINES:
+            if board[a] == board[b] == board[c] != EMPTY:
+                return board[a]
+        return None if EMPTY in board else TIE
+
+    @staticmethod
+    def inner_heuristic(board, mine, theirs):
+        score = 0
+        for line in LINES:
+            markers = [board[space] for space in line]
+            if mine in markers and theirs not in markers:
+                score += 10 ** markers.count(mine)
+        return score
+
+    def condition(self):
+        return [winner if winner in MARKERS else EMPTY
+                for winner in self.winners]
+
+    def legal_moves(self):
+        if self.winner is not None:
+            return []
+        if self.target >= 0 and self.winners[self.target] is None:
+            inners = [self.target]
+        else:
+            inners = [inner for inner in range(9)
+                      if self.winners[inner] is None]
+        return [inner * 9 + space for inner in inners for space in range(9)
+                if self.boards[inner][space] == EMPTY]
+
+    def make_move(self, move):
+        inner, space = divmod(move, 9)
+        self.boards[inner][space] = MARKERS[self.player]
+        if self.winners[inner] is None:
+            self.winners[inner] = self.validate(self.boards[inner])
+        won = self.validate(self.condition())
+        if won in MARKERS:
+            self.winner = won
+        elif None not in self.winners:
+            self.winner = TIE
+        self.player = 1 - self.player
+        self.target = space
+
+    def heuristic(self, player):
+        mine, theirs = MARKERS[player], MARKERS[1 - player]
+        score = sum(self.inner_heuristic(board, mine, theirs)
+                    for board in self.boards)
+        return score + self.inner_heuristic(self.condition(), mine,
+                                            theirs) * 2
+
+
+def assert_same(game, reference):
+    assert sorted(game.legal_moves()) == reference.legal_moves()
+    assert game.winner == reference.winner
+    assert [game.inner_winner(inner) for inner in range(9)] == \
+        reference.winners
+    for player in range(2):
+        assert game.heuristic(player) == reference.heuristic(player)
+        assert game.heuristic(player) == game.full_heuristic(player)
+    for inner in range(9):
+        for space in range(9):
+            assert (game.marker_at(inner, space)
+                    == reference.boards[inner][space])
+
+
+def test_random_games_match_list_rules():
+    rand = random.Random(2024)
+    for index in range(200):
+        game, reference = GameState(), ListGame()
+        while game.winner is None:
+            assert_same(game, reference)
+            move = rand.choice(game.legal_moves())
+            game.make_move(move)
+            reference.make_move(move)
+        assert_same(game, reference)
+
+
+def test_undo_restores_every_position():
+    rand = random.Random(7)
+    for index in range(50):
+        game = GameState()
+        snapshots = []
+        while game.winner is None:
+            snapshots.append((game.encode(), game.hash, game.winner,
+                              game.scores[:], game.indices[:]))
+            game.make_move(rand.choice(game.legal_moves()))
+        while snapshots:
+            game.undo()
+            assert (game.encode(), game.hash, game.winner, game.scores,
+                    game.indices) == snapshots.pop()
+        assert game.compute_hash() == game.hash
+
+
+def test_perft_from_empty_board():
+    game = GameState()
+    for depth, nodes in PERFT.items():
+        assert perft(game, depth) == nodes
+    assert game.encode() == GameState().encode()
+
+
+def test_perft_matches_list_rules():
+    def list_perft(reference, depth):
+        if reference.winner is not None:
+            return 1
+        moves = reference.legal_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            child = ListGame()
+            child.boards = [board[:] for board in reference.boards]
+            child.winners = reference.winners[:]
+            child.player, child.target = reference.player, reference.target
+            child.make_move(move)
+            nodes += list_perft(child, depth - 1)
+        return nodes
+
+    assert list_perft(ListGame(), 3) == PERFT[3]
+
+
+def test_random_playout_matches_random_moves():
+    rand = random.Random(11)
+    for index in range(100):
+        game = GameState()
+        for ply in range(rand.randrange(40)):
+            if game.winner is not None:
+                break
+            game.make_move(game.random_move(rand.random))
+        snapshot = (game.encode(), game.hash, game.scores[:],
+                    len(game.history))
+        seed = rand.random()
+        winner = game.random_playout(random.Random(seed).random)
+        assert (game.encode(), game.hash, game.scores,
+                len(game.history)) == snapshot
+        moves = random.Random(seed).random
+        while game.winner is None:
+            game.make_move(game.random_move(moves))
+        assert winner == game.winner
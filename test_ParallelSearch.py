@@ -0,0 +1,35 @@
+"""ParallelSearch must choose the same move and score as AlphaBetaSearch.
+
+Without transposition tables both searches visit the root moves in the
+same order to the same depth, so on any position their results agree.
+"""
+import random
+from GameState import GameState
+from Search import AlphaBetaSearch
+from ParallelSearch import ParallelSearch
+
+
+def random_positions(count, seed):
+    rand = random.Random(seed)
+    games = [GameState()]
+    while len(games) < count:
+        game = GameState()
+        for ply in range(rand.randrange(1, 50)):
+            game.make_move(game.random_move(rand.random))
+            if game.winner is not None:
+                break
+        if game.winner is None:
+            games.append(game)
+    return games
+
+
+def test_parallel_matches_serial_search():
+    depth = 4
+    serial = AlphaBetaSearch(depth, time_limit=None, table=False)
+    with ParallelSearch(depth, time_limit=None, workers=2) as parallel:
+        for game in random_positions(20, 8):
+            code = game.encode()
+            move = parallel.search(game)
+            assert game.encode() == code
+            assert (move, parallel.score, parallel.depth) == (
+                serial.search(game), serial.score, serial.depth)